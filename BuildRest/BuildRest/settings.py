@@ -28,12 +28,25 @@ INSTALLED_APPS = [
 ]
 
 REST_FRAMEWORK = {
+    # the stateless class takes users from the claims of their tokens, JWTAuthentication loads them
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'building.authentication.StatelessJWTAuthentication' if config('JWT_STATELESS', default=True, cast=bool)
+        else 'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'building.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'building.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'building.pagination.StandardPagination',
+    'PAGE_SIZE': 100,
 }
 
 SIMPLE_JWT = {
@@ -41,6 +54,12 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
 }
 
+# seconds a process may go on accepting the tokens of a user revoked by another one
+JWT_REVOCATION_CACHE_TIMEOUT = config('JWT_REVOCATION_CACHE_TIMEOUT', default=60, cast=int)
+
+# seconds a process may go on refreshing a token blacklisted by another one, see building/blacklist.py
+TOKEN_BLACKLIST_SYNC_INTERVAL = config('TOKEN_BLACKLIST_SYNC_INTERVAL', default=5, cast=float)
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -79,12 +98,69 @@ DATABASES = {
         'USER': config("USER"),
         'PASSWORD': config("PASSWORD"),
         'HOST': config("HOST"),
-        'PORT': config("PORT")
+        'PORT': config("PORT"),
+        # seconds to keep a connection across requests, 0 closes it at the end of each one
+        'CONN_MAX_AGE': config('CONN_MAX_AGE', default=60, cast=int),
+        # the keys below need ENGINE=building.db: a reused connection is checked with SELECT 1
+        # before its first query in a request, and MAX_SIZE > 0 keeps up to that many connections
+        # per process in a pool, handed out for TIMEOUT seconds at most and closed after RECYCLE
+        'CONN_HEALTH_CHECKS': config('CONN_HEALTH_CHECKS', default=True, cast=bool),
+        'POOL': {
+            'MAX_SIZE': config('DB_POOL_MAX_SIZE', default=0, cast=int),
+            'TIMEOUT': config('DB_POOL_TIMEOUT', default=10, cast=float),
+            'RECYCLE': config('DB_POOL_RECYCLE', default=1800, cast=int),
+        },
     }
 }
 
+# the migrations need the pg_trgm extension for the trigram indexes behind the name and address
+# filters; set TRIGRAM_INDEXES=False to go without them on a server that does not have it
+TRIGRAM_INDEXES = config('TRIGRAM_INDEXES', default=True, cast=bool)
+
+# responses are only cached by default with a shared backend, e.g. CACHE_BACKEND=django_redis.cache.RedisCache
+# and CACHE_LOCATION=redis://127.0.0.1:6379/1: a local memory cache is only invalidated in its own process,
+# so with several server processes the others would keep answering from it
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=10000, cast=int),
+        },
+    }
+}
+
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', cast=int, default=0 if CACHES['default']['BACKEND'] in (
+    'django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache') else 60)
+
+FAST_LIST_SERIALIZERS = config('FAST_LIST_SERIALIZERS', default=True, cast=bool)
+
+# 'sync' evaluates new measurements in the request that creates them, 'queue' leaves them
+# to the workers started by the run_evaluation_workers command
+EVALUATION_MODE = config('EVALUATION_MODE', default='sync')
+
+EVALUATION_MAX_ATTEMPTS = config('EVALUATION_MAX_ATTEMPTS', default=3, cast=int)
+
 AUTH_USER_MODEL = 'building.CustomUser'
 
+# PASSWORD_HASHER picks the hasher of new passwords, the others only check existing ones;
+# argon2 needs the argon2-cffi package and bcrypt the bcrypt package
+PASSWORD_HASHER_CLASSES = {
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'pbkdf2_sha1': 'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'argon2': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'bcrypt': 'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+}
+PASSWORD_HASHER = config('PASSWORD_HASHER', default='pbkdf2')
+
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    path for name, path in PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHER]
+
+# processes the provision_users command hashes passwords in, see building/users.py; the
+# /api/users/bulk/ endpoint always hashes in its own process
+PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=1, cast=int)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -0,0 +1,117 @@
+from io import BytesIO
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import HttpResponse, HttpResponseNotAllowed
+from rest_framework import exceptions
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from .ingest import ingest_measurements
+from .parsers import FastJSONParser, NDJSONParser
+from .renderers import FastJSONRenderer
+from .serializers import MeasurementSerializer
+from .views import MeasurementViewSet
+
+# Measurement endpoints for ASGI deployments, under /api/async/. Requests are read, parsed and
+# answered on the event loop, and only the database work goes to a thread pool (its size is set
+# by ASGI_THREADS). Django 3.2 has no async ORM, and under ASGI it runs every sync view on one
+# shared thread, so the DRF views alone would serve one request at a time per process.
+
+
+def database_sync_to_async(func):
+    # pool threads keep their own connections, which the request signals never see
+    def call(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False)
+
+
+def async_csrf_exempt(view):
+    # csrf_exempt() hides that a view is a coroutine function before Django 4.1
+    view.csrf_exempt = True
+    return view
+
+
+def run_view(view):
+    def call(request, *args, **kwargs):
+        return view(request, *args, **kwargs).render()
+    return database_sync_to_async(call)
+
+
+def render(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def render_exception(request, exc):
+    # the same bodies and headers as DRF's exception handler
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = render(data, exc.status_code)
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        response['WWW-Authenticate'] = JWTAuthentication().authenticate_header(request)
+    return response
+
+
+def authenticate(request):
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        result = authentication_class().authenticate(request)
+        if result is not None:
+            return result[0]
+    raise exceptions.NotAuthenticated()
+
+
+@database_sync_to_async
+def ingest(request, rows):
+    # one trip to the pool, so that a request needs a single database connection
+    measurements, errors = ingest_measurements(rows, authenticate(request))
+    return MeasurementSerializer(measurements, many=True).data, errors
+
+
+def parse(request):
+    if request.content_type == NDJSONParser.media_type:
+        return NDJSONParser().parse(BytesIO(request.body), request.content_type)
+    return FastJSONParser().parse(BytesIO(request.body), request.content_type)
+
+
+list_measurements = run_view(MeasurementViewSet.as_view({'get': 'list'}))
+retrieve_measurement = run_view(MeasurementViewSet.as_view({'get': 'retrieve'}))
+
+
+@async_csrf_exempt
+async def measurements(request):
+    if request.method == 'GET':
+        return await list_measurements(request)
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['GET', 'POST'])
+    try:
+        data = parse(request)
+        if not isinstance(data, dict):
+            raise exceptions.ValidationError('Expected a measurement.')
+        created, errors = await ingest(request, [data])
+    except exceptions.APIException as exc:
+        return render_exception(request, exc)
+    if errors:
+        return render(errors[0]['errors'], 400)
+    return render(created[0], 201)
+
+
+@async_csrf_exempt
+async def bulk_measurements(request):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        data = parse(request)
+        if not isinstance(data, list):
+            raise exceptions.ValidationError('Expected a list of measurements.')
+        created, errors = await ingest(request, data)
+    except exceptions.APIException as exc:
+        return render_exception(request, exc)
+    return render({'created': created, 'errors': errors}, 400 if errors and not created else 201)
+
+
+@async_csrf_exempt
+async def measurement(request, pk):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    return await retrieve_measurement(request, pk=pk)
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTTokenUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from .models import CustomUser
+
+# StatelessJWTAuthentication takes the user from the claims of the token (a TokenUser with id,
+# is_superuser and is_staff) instead of loading it. What it still needs from the database is
+# whether the user's tokens were revoked: CustomUser.tokens_valid_after, set when the user is
+# deactivated, deleted or has their password or privileges changed, and kept in the cache for
+# JWT_REVOCATION_CACHE_TIMEOUT seconds, the longest other processes may go on accepting them.
+
+
+def revocation_key(user_id):
+    return 'building:auth:%s' % user_id
+
+
+def get_valid_after(user_id):
+    # a timestamp, 0 when no tokens were revoked and None when the user cannot authenticate at all
+    key = revocation_key(user_id)
+    valid_after = cache.get(key, -1)
+    if valid_after == -1:
+        user = CustomUser.objects.filter(id=user_id).values_list('is_active', 'tokens_valid_after').first()
+        if user is None or not user[0]:
+            valid_after = None
+        else:
+            valid_after = user[1].timestamp() if user[1] is not None else 0
+        cache.set(key, valid_after, settings.JWT_REVOCATION_CACHE_TIMEOUT)
+    return valid_after
+
+
+def forget_revocation(user_id):
+    cache.delete(revocation_key(user_id))
+
+
+class StatelessJWTAuthentication(JWTTokenUserAuthentication):
+    def get_user(self, validated_token):
+        if 'auth_time' not in validated_token:
+            # issued before the claims were added
+            return JWTAuthentication.get_user(self, validated_token)
+        user = super().get_user(validated_token)
+        valid_after = get_valid_after(user.id)
+        if valid_after is None:
+            raise AuthenticationFailed('User not found or inactive', code='user_inactive')
+        if validated_token['auth_time'] < valid_after:
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+        return user
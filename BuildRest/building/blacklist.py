@@ -0,0 +1,105 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+# Refresh tokens are checked against a Bloom filter of the blacklisted jti before the
+# token_blacklist tables, so that only blacklisted tokens and the odd false positive cost a
+# query. The filter is built in each process on its first check from the tokens that have not
+# expired yet, and picks up tokens blacklisted by other processes every
+# TOKEN_BLACKLIST_SYNC_INTERVAL seconds, the longest such a token may still be refreshed there.
+
+# how far back a sync looks, for blacklistings committed after the previous one began
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        # double hashing over the two halves of one digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+class BlacklistFilter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filter = None
+        self.synced_at = None
+        self.checked_at = None
+
+    def blacklisted(self, since=None):
+        queryset = BlacklistedToken.objects.filter(token__expires_at__gt=aware_utcnow())
+        if since is not None:
+            queryset = queryset.filter(blacklisted_at__gte=since - SYNC_OVERLAP)
+        return queryset.values_list('token__jti', flat=True).iterator()
+
+    def warm(self):
+        started = aware_utcnow()
+        jtis = list(self.blacklisted())
+        bloom = BloomFilter(max(10000, 2 * len(jtis)))
+        for jti in jtis:
+            bloom.add(jti)
+        self.filter, self.synced_at = bloom, started
+
+    def sync(self):
+        with self.lock:
+            if self.filter is not None and time.monotonic() - self.checked_at < settings.TOKEN_BLACKLIST_SYNC_INTERVAL:
+                return
+            if self.filter is None or self.filter.count > self.filter.capacity:
+                self.warm()
+            else:
+                started = aware_utcnow()
+                for jti in self.blacklisted(self.synced_at):
+                    self.filter.add(jti)
+                self.synced_at = started
+            self.checked_at = time.monotonic()
+
+    def add(self, jti):
+        self.sync()
+        with self.lock:
+            self.filter.add(jti)
+
+    def __contains__(self, jti):
+        self.sync()
+        return jti in self.filter
+
+    def clear(self):
+        with self.lock:
+            self.filter = None
+
+
+blacklist_filter = BlacklistFilter()
+
+
+class RefreshToken(tokens.RefreshToken):
+    def check_blacklist(self):
+        if self.payload[api_settings.JTI_CLAIM] in blacklist_filter:
+            super().check_blacklist()
+
+    def blacklist(self):
+        result = super().blacklist()
+        blacklist_filter.add(self.payload[api_settings.JTI_CLAIM])
+        return result
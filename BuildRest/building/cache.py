@@ -0,0 +1,46 @@
+import hashlib
+import json
+import uuid
+from django.core.cache import cache
+from django.db import transaction
+
+# Cached responses are keyed by the current version of every scope they depend on:
+# 'construction:<id>' for a detail, 'owner:<id>' for a user's list and 'all' for a superuser's list.
+# Invalidating gives the scopes new versions, which orphans the old entries until they expire.
+
+
+def version_keys(scopes):
+    return ['building:version:%s' % scope for scope in scopes]
+
+
+def get_versions(scopes):
+    keys = version_keys(scopes)
+    versions = cache.get_many(keys)
+    # a version that expired or was culled gets a new value, never the one it had before
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def invalidate(scopes):
+    scopes = list(scopes)
+    # before commit another request could still read the old rows and cache them under the new version
+    transaction.on_commit(lambda: cache.set_many({key: uuid.uuid4().hex for key in version_keys(scopes)}, None))
+
+
+def invalidate_constructions(constructions):
+    # constructions are (id, owner_id) pairs
+    scopes = {'all'}
+    for construction_id, owner_id in constructions:
+        scopes.add('construction:%s' % construction_id)
+        if owner_id is not None:
+            scopes.add('owner:%s' % owner_id)
+    invalidate(scopes)
+
+
+def response_key(request, versions):
+    user = request.user
+    key = json.dumps([user.id, user.is_superuser, request.get_full_path(), request.accepted_media_type, versions])
+    return 'building:response:%s' % hashlib.md5(key.encode('utf-8')).hexdigest()
@@ -0,0 +1,84 @@
+import threading
+import psycopg2.extras
+from django.db.backends.postgresql.base import Database, DatabaseWrapper as PostgreSQLDatabaseWrapper
+from .creation import DatabaseCreation
+from .pool import ConnectionPool
+
+# The PostgreSQL backend with the connection health checks of Django 4.1 and an optional
+# in-process pool, set up through the CONN_HEALTH_CHECKS and POOL keys of a database (see
+# settings.DATABASES). With a pool, closing a connection returns it to the pool, so with
+# CONN_MAX_AGE = 0 every request and every async_views thread pool call borrows one.
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def connect(conn_params):
+    connection = Database.connect(**conn_params)
+    psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+    return connection
+
+
+class DatabaseWrapper(PostgreSQLDatabaseWrapper):
+    creation_class = DatabaseCreation
+    health_check_done = False
+
+    @property
+    def health_checks(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    def get_pool(self, conn_params):
+        options = self.settings_dict.get('POOL') or {}
+        if not options.get('MAX_SIZE'):
+            return None
+        key = (self.alias, tuple(sorted(conn_params.items())))
+        with pools_lock:
+            if key not in pools:
+                pools[key] = ConnectionPool(lambda: connect(conn_params), options['MAX_SIZE'],
+                                            options.get('TIMEOUT', 10), options.get('RECYCLE'))
+            return pools[key]
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool(conn_params)
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection = pool.getconn(check=self.health_checks)
+        self.pool = pool
+        self.isolation_level = self.settings_dict['OPTIONS'].get('isolation_level', connection.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def _close(self):
+        pool = getattr(self, 'pool', None)
+        if pool is None or self.connection is None:
+            return super()._close()
+        self.pool = None
+        # a connection closed inside an atomic block is still referenced until it ends, and one
+        # closed after an error failed its check in close_if_unusable_or_obsolete()
+        if self.in_atomic_block or self.errors_occurred:
+            pool.discard(self.connection)
+        else:
+            pool.putconn(self.connection)
+
+    def close_if_unusable_or_obsolete(self):
+        # called when a request starts and ends
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self):
+        # a persistent connection may have been closed by the server since the last request
+        if self.connection is None or self.health_check_done or not self.health_checks:
+            return
+        self.health_check_done = True
+        if not self.is_usable():
+            self.errors_occurred = True
+            self.close()
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from collections import deque
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """
+    A thread safe pool of at most ``max_size`` connections made by ``connect``. getconn() waits up
+    to ``timeout`` seconds for one to be returned when all are in use, and connections older than
+    ``recycle`` seconds are closed instead of being handed out again. A forked process starts
+    with an empty pool, as the sockets of its parent's connections are not its own.
+    """
+
+    pools = []
+
+    def __init__(self, connect, max_size=10, timeout=10, recycle=None):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.condition = threading.Condition()
+        self.inherited = []
+        self.reset()
+        self.pools.append(self)
+
+    def reset(self):
+        # closing a connection of the parent process would end its session, so they are only kept
+        # from being collected
+        self.inherited.extend(getattr(self, 'created', ()))
+        self.pid = os.getpid()
+        self.idle = deque()
+        self.created = {}
+        self.opened = 0
+
+    def check_pid(self):
+        if self.pid != os.getpid():
+            self.reset()
+
+    def expired(self, connection):
+        return self.recycle is not None and time.monotonic() - self.created[connection] >= self.recycle
+
+    def getconn(self, check=False):
+        # the most recently returned connection first, so that surplus ones get old and recycled
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self.condition:
+                self.check_pid()
+                while not self.idle and self.opened >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout('No database connection was free within %s seconds.' % self.timeout)
+                    self.condition.wait(remaining)
+                if not self.idle:
+                    self.opened += 1
+                    break
+                connection = self.idle.pop()
+            if connection.closed or self.expired(connection) or (check and not is_usable(connection)):
+                self.discard(connection)
+                continue
+            return connection
+        try:
+            connection = self.connect()
+        except Exception:
+            with self.condition:
+                self.opened -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.created[connection] = time.monotonic()
+        return connection
+
+    def putconn(self, connection):
+        with self.condition:
+            self.check_pid()
+            if connection not in self.created:
+                return
+        status = TRANSACTION_STATUS_UNKNOWN if connection.closed else connection.info.transaction_status
+        if status != TRANSACTION_STATUS_IDLE and status != TRANSACTION_STATUS_UNKNOWN:
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                status = TRANSACTION_STATUS_UNKNOWN
+        if status == TRANSACTION_STATUS_UNKNOWN or self.expired(connection):
+            self.discard(connection)
+            return
+        with self.condition:
+            self.idle.append(connection)
+            self.condition.notify()
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+        with self.condition:
+            if self.created.pop(connection, None) is not None:
+                self.opened -= 1
+            self.condition.notify()
+
+    def close(self):
+        # closes the idle connections, the ones in use are closed when returned
+        with self.condition:
+            self.check_pid()
+            idle, self.idle = list(self.idle), deque()
+        for connection in idle:
+            self.discard(connection)
+
+
+def close_idle_connections():
+    for pool in ConnectionPool.pools:
+        pool.close()
+
+
+os.register_at_fork(before=close_idle_connections)
+
+
+def is_usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        return True
+    except psycopg2.Error:
+        return False
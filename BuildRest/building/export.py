@@ -0,0 +1,81 @@
+import csv
+import io
+from decimal import Decimal
+from django.db import models
+from rest_framework.settings import api_settings
+from .renderers import FastJSONRenderer
+
+
+class StreamBuffer(io.RawIOBase):
+    # a write-only file whose contents are handed out and dropped as the response streams
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def write_csv(names, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def write_ndjson(names, chunks):
+    # decimals as the API serializers give them, strings unless COERCE_DECIMAL_TO_STRING is off
+    renderer = FastJSONRenderer()
+    coerce = api_settings.COERCE_DECIMAL_TO_STRING
+    for rows in chunks:
+        yield b''.join(renderer.render({name: str(value) if coerce and isinstance(value, Decimal) else value
+                                        for name, value in zip(names, row)}) + b'\n' for row in rows)
+
+
+def parquet_type(pa, field):
+    if isinstance(field, (models.AutoField, models.IntegerField, models.ForeignKey)):
+        return pa.int64()
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    if isinstance(field, (models.DecimalField, models.FloatField)):
+        return pa.float64()
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    return pa.string()
+
+
+def write_parquet(names, fields, chunks):
+    # one row group per chunk, so only a chunk is ever held in memory
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(name, parquet_type(pa, field)) for name, field in zip(names, fields)])
+    buffer = StreamBuffer()
+    writer = pq.ParquetWriter(buffer, schema)
+    for rows in chunks:
+        columns = [[float(value) if isinstance(value, Decimal) else value for value in column]
+                   for column in zip(*rows)]
+        writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+        yield buffer.drain()
+    writer.close()
+    yield buffer.drain()
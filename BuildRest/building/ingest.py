@@ -0,0 +1,186 @@
+import csv
+import io
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Now
+from .cache import invalidate_constructions
+from .evaluate import evaluate_batch
+from .models import Construction, Evaluation, EvaluationTask, Measurement, Prediction
+from .predict import prediction_batch
+from .rollups import add_rollups
+from .serializers import BulkMeasurementSerializer
+
+
+def load_construction_parts(construction_ids):
+    rows = Construction.objects.filter(id__in=set(construction_ids)).values_list(
+        'id', 'owner_id', 'build_date', 'roof__roof_material', 'walls__walls_material',
+        'floor__floor_type', 'foundation__foundation_material')
+    return {row[0]: row[1:] for row in rows}
+
+
+def update_latest_evaluations(construction_ids):
+    latest = Evaluation.objects.filter(measurement__construction_id=OuterRef('pk')).order_by(
+        '-measurement__date', '-measurement_id')
+    constructions = Construction.objects.filter(id__in=set(construction_ids))
+    updated = constructions.update(
+        latest_evaluation_id=Subquery(latest.values('measurement_id')[:1]),
+        construction_reliability=Subquery(latest.values('construction_reliability')[:1]),
+        construction_damage=Subquery(latest.values('construction_damage')[:1]),
+        final_coefficient=Subquery(latest.values('final_coefficient')[:1]),
+        updated_at=Now(),
+    )
+    invalidate_constructions(constructions.values_list('id', 'owner_id'))
+    return updated
+
+
+def update_latest_predictions(construction_ids):
+    latest = Prediction.objects.filter(construction_id=OuterRef('pk')).order_by('-date', '-id')
+    constructions = Construction.objects.filter(id__in=set(construction_ids))
+    updated = constructions.update(
+        years_until_full_warning=Subquery(latest.values('years_until_full_warning')[:1]),
+        updated_at=Now(),
+    )
+    invalidate_constructions(constructions.values_list('id', 'owner_id'))
+    return updated
+
+
+def evaluate_measurements(measurements, parts=None):
+    if parts is None:
+        parts = load_construction_parts(measurement.construction_id for measurement in measurements)
+    measurements = [measurement for measurement in measurements
+                    if None not in parts.get(measurement.construction_id, (None,))]
+    if not measurements:
+        return []
+    buildings = [parts[measurement.construction_id] for measurement in measurements]
+    result = evaluate_batch([measurement.id for measurement in measurements],
+                            [building[1] for building in buildings],
+                            [[building[i] for building in buildings] for i in range(2, 6)],
+                            [measurement.humidity for measurement in measurements],
+                            [measurement.acoustic_analysis for measurement in measurements],
+                            [measurement.vibration for measurement in measurements])
+    columns = {field: values.tolist() for field, values in result.items() if field != 'measurement'}
+    evaluations = [Evaluation(measurement_id=measurement.id, **{field: values[i] for field, values in columns.items()})
+                   for i, measurement in enumerate(measurements)]
+    copy_objects(Evaluation, evaluations)
+    update_latest_evaluations(measurement.construction_id for measurement in measurements)
+    return evaluations
+
+
+def enqueue_evaluations(measurement_ids):
+    # leaves the measurements to the evaluation workers, see building.tasks
+    return EvaluationTask.objects.bulk_create([EvaluationTask(measurement_id=measurement_id)
+                                               for measurement_id in measurement_ids], ignore_conflicts=True)
+
+
+def predict_constructions(constructions, horizons=10, step=5):
+    # constructions are (id, final_coefficient, build_date) rows
+    constructions = list(constructions)
+    result = prediction_batch([row[0] for row in constructions], [row[1] for row in constructions],
+                              [row[2] for row in constructions], horizons, step)
+    predictions = [Prediction(construction_id=id, years_until_full_fix=fix, years_until_full_warning=warning,
+                              construction_damage_predicted=damage)
+                   for id, fix, warning, damage in zip(*[result[field].tolist() for field in (
+                       'construction', 'years_until_full_fix', 'years_until_full_warning',
+                       'construction_damage_predicted')])]
+    Prediction.objects.bulk_create(predictions)
+    update_latest_predictions(prediction.construction_id for prediction in predictions)
+    return predictions
+
+
+def copy_objects(model, objects):
+    # COPY is much cheaper than INSERT for large batches and, unlike bulk_create(),
+    # keeps explicitly set auto_now_add values such as the dates of historical readings
+    if not objects:
+        return objects
+    connection = connections[router.db_for_write(model)]
+    table = model._meta.db_table
+    fields = model._meta.concrete_fields
+    with connection.cursor() as cursor:
+        if model._meta.auto_field:
+            cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+                           [table, model._meta.auto_field.column, len(objects)])
+            for obj, (pk,) in zip(objects, cursor.fetchall()):
+                obj.pk = pk
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for obj in objects:
+            row = []
+            for field in fields:
+                value = getattr(obj, field.attname)
+                if value is None and (getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)):
+                    value = field.pre_save(obj, True)
+                row.append(field.get_db_prep_save(value, connection))
+            writer.writerow(row)
+            obj._state.adding = False
+            obj._state.db = connection.alias
+        copy_buffer(cursor, connection, table, fields, buffer)
+    return objects
+
+
+def update_objects(model, objects, fields):
+    # bulk_update() spends most of its time building CASE expressions in Python;
+    # COPY the new values into a temporary table and update from it in one statement
+    if not objects:
+        return 0
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    table = model._meta.db_table
+    temporary = table + '_update'
+    pk = model._meta.pk
+    fields = [model._meta.get_field(name) for name in fields]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for obj in objects:
+        writer.writerow([field.get_db_prep_save(getattr(obj, field.attname), connection) for field in [pk] + fields])
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute('CREATE TEMPORARY TABLE {} AS SELECT {} FROM {} WITH NO DATA'.format(
+            quote(temporary), ', '.join(quote(field.column) for field in [pk] + fields), quote(table)))
+        copy_buffer(cursor, connection, temporary, [pk] + fields, buffer)
+        cursor.execute('UPDATE {table} SET {columns} FROM {temporary} WHERE {table}.{pk} = {temporary}.{pk}'.format(
+            table=quote(table), temporary=quote(temporary), pk=quote(pk.column),
+            columns=', '.join('{0} = {1}.{0}'.format(quote(field.column), quote(temporary)) for field in fields)))
+        updated = cursor.rowcount
+        cursor.execute('DROP TABLE {}'.format(quote(temporary)))
+    return updated
+
+
+def copy_buffer(cursor, connection, table, fields, buffer):
+    buffer.seek(0)
+    cursor.copy_expert('COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+        connection.ops.quote_name(table),
+        ', '.join(connection.ops.quote_name(field.column) for field in fields)), buffer)
+
+
+def ingest_measurements(rows, user):
+    errors = []
+    valid = []
+    for index, row in enumerate(rows):
+        serializer = BulkMeasurementSerializer(data=row)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+
+    parts = load_construction_parts(data['construction_id'] for index, data in valid)
+    measurements = []
+    for index, data in valid:
+        building = parts.get(data['construction_id'])
+        if building is None or not (user.is_superuser or building[0] == user.id):
+            errors.append({'index': index, 'errors': {'construction': [
+                'Invalid pk "{}" - object does not exist.'.format(data['construction_id'])]}})
+        elif None in building:
+            errors.append({'index': index, 'errors': {'construction': [
+                'Construction must have roof, walls, floor and foundation to be evaluated.']}})
+        else:
+            measurements.append(Measurement(**data))
+
+    with transaction.atomic():
+        measurements = Measurement.objects.bulk_create(measurements)
+        add_rollups(measurement.id for measurement in measurements)
+        if settings.EVALUATION_MODE == 'queue':
+            enqueue_evaluations(measurement.id for measurement in measurements)
+        else:
+            evaluate_measurements(measurements, parts)
+    errors.sort(key=lambda error: error['index'])
+    return measurements, errors
@@ -0,0 +1,453 @@
+import io
+import random
+import re
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from importlib import import_module
+import numpy as np
+from django.contrib.auth.hashers import get_hashers
+from django.core.management import BaseCommand, CommandError
+from django.db import close_old_connections, connection, connections, transaction
+from django.db.migrations import AddIndex
+from django.db.models import Count, OuterRef, Subquery
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import APIView
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework.test import APIClient
+from ...authentication import StatelessJWTAuthentication
+from ...blacklist import RefreshToken, blacklist_filter
+from ...db.base import DatabaseWrapper as PooledDatabaseWrapper
+from ...evaluate import evaluate, evaluate_batch
+from ...models import CustomUser, Construction, Measurement, Prediction, Evaluation
+from ...parsers import FastJSONParser
+from ...partitions import TABLE, get_partitions, is_partitioned
+from ...renderers import FastJSONRenderer
+from ...serializers import (ConstructionSerializer, EvaluationSerializer, FastSerializer, MeasurementSerializer,
+                            PredictionSerializer)
+from ...users import hash_passwords
+from ...views import ConstructionFilter, MeasurementFilter, EvaluationFilter, PredictionFilter
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def explain_time(queryset):
+    # explain() only returns the first hundred lines of a plan
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + sql, params)
+        return cursor.fetchone()[0][0]['Execution Time']
+
+
+def explain_partitions(cursor, sql, params, repeat=5):
+    # best execution time and the number of measurement tables the plan reads
+    times = []
+    for _ in range(repeat):
+        cursor.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0][0]
+        times.append(plan['Execution Time'])
+    scanned = set()
+
+    def walk(node):
+        if node.get('Relation Name', '').startswith(TABLE):
+            scanned.add(node['Relation Name'])
+        for child in node.get('Plans', ()):
+            walk(child)
+
+    walk(plan['Plan'])
+    return min(times), len(scanned)
+
+
+def filter_querysets():
+    construction = Construction.objects.order_by('id')[Construction.objects.count() // 2]
+    measured = Measurement.objects.order_by('date').values_list('date', flat=True)
+    measured = measured[measured.count() // 2]
+    predicted = Prediction.objects.order_by('date').values_list('date', flat=True)
+    predicted = predicted[predicted.count() // 2] if predicted.exists() else date.today()
+    owned = Construction.objects.filter(owner_id=construction.owner_id)
+    word = construction.name[:4]
+    street = construction.address.split()[-1]
+    built = {'min_build_date': construction.build_date - timedelta(days=365),
+             'max_build_date': construction.build_date + timedelta(days=365)}
+    height = {'min_height': construction.height - 10, 'max_height': construction.height + 10}
+    month = {'min_measurement_date': measured, 'max_measurement_date': measured + timedelta(days=30)}
+    return [
+        ('constructions name (owner)', ConstructionFilter({'name': word}, owned).qs),
+        ('constructions name (all)', ConstructionFilter({'name': word}, Construction.objects.all()).qs),
+        ('constructions address (all)', ConstructionFilter({'address': street}, Construction.objects.all()).qs),
+        ('constructions build_date (owner)', ConstructionFilter(built, owned).qs),
+        ('constructions build_date (all)', ConstructionFilter(built, Construction.objects.all()).qs),
+        ('constructions height (owner)', ConstructionFilter(height, owned).qs),
+        ('constructions height (all)', ConstructionFilter(height, Construction.objects.all()).qs),
+        ('measurements date (owner)', MeasurementFilter(month, Measurement.objects.filter(
+            construction__owner_id=construction.owner_id)).qs),
+        ('measurements date (all)', MeasurementFilter(month, Measurement.objects.all()).qs),
+        ('measurements construction', MeasurementFilter({'construction': word}, Measurement.objects.all()).qs),
+        ('measurements of a construction', Measurement.objects.filter(construction_id=construction.id)
+            .order_by('date')),
+        ('measurements keyset page', Measurement.objects.filter(date__gte=measured).order_by('date', 'id')[:101]),
+        ('evaluations date (all)', EvaluationFilter({'min_evaluation_date': measured,
+                                                     'max_evaluation_date': measured + timedelta(days=30)},
+                                                    Evaluation.objects.all()).qs),
+        ('predictions date (all)', PredictionFilter({'min_prediction_date': predicted,
+                                                     'max_prediction_date': predicted + timedelta(days=30)},
+                                                    Prediction.objects.all()).qs),
+        ('predictions of a construction', Prediction.objects.filter(construction_id=construction.id)
+            .order_by('date')),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Runs performance benchmarks for the building app'
+
+    targets = ['evaluate', 'filters', 'cache', 'serializers', 'json', 'partitions', 'connections', 'auth', 'blacklist',
+               'hashers', 'at-risk']
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=self.targets)
+        parser.add_argument('-r', '--rows', type=int, default=100000)
+        parser.add_argument('-n', '--requests', type=int, default=200, help='Requests per endpoint for HTTP targets')
+        parser.add_argument('-w', '--workers', type=int, nargs='+', default=[1, 2, 4],
+                            help='Process counts for the hashers target')
+        parser.add_argument('-k', type=int, default=100, help='Ranking length for the at-risk target')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        getattr(self, 'bench_%s' % options['target'].replace('-', '_'))(options)
+
+    def bench_evaluate(self, options):
+        rows = options['rows']
+        ids = list(range(rows))
+        dates = [date(1950, 1, 1) + timedelta(days=random.randint(0, 25000)) for _ in ids]
+        materials = [[str(random.randint(1, 8)) for _ in ids] for _ in range(4)]
+        humidity = [Decimal(str(round(random.uniform(0, 1), 2))) for _ in ids]
+        acoustic = [Decimal(str(round(random.uniform(0, 1), 2))) for _ in ids]
+        vibration = [Decimal(str(round(random.uniform(0, 1), 3))) for _ in ids]
+
+        def scalar():
+            return [evaluate(ids[i], dates[i], [part[i] for part in materials],
+                             humidity[i], acoustic[i], vibration[i]) for i in ids]
+
+        expected, scalar_time = timed(scalar)
+        result, batch_time = timed(evaluate_batch, ids, dates, materials, humidity, acoustic, vibration)
+
+        for field in expected[0]:
+            if not np.array_equal(result[field], [row[field] for row in expected]):
+                raise CommandError('evaluate_batch differs from evaluate on %s' % field)
+
+        self.stdout.write('evaluate() loop:  {:>8.3f}s  {:>12,.0f} rows/s'.format(scalar_time, rows / scalar_time))
+        self.stdout.write('evaluate_batch(): {:>8.3f}s  {:>12,.0f} rows/s'.format(batch_time, rows / batch_time))
+        self.stdout.write(self.style.SUCCESS('{:.1f}x faster, identical results for {:,} rows'.format(
+            scalar_time / batch_time, rows)))
+
+    def bench_filters(self, options):
+        if not Measurement.objects.exists():
+            raise CommandError('No data to benchmark, run generate_data --fast first')
+        migration = import_module('building.migrations.0003_filter_indexes')
+        indexes = [operation.index.name for operation in migration.Migration.operations
+                   if isinstance(operation, AddIndex)]
+        indexes += [name for name, table, column in migration.trigram_indexes]
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        querysets = filter_querysets()
+        after = [explain_time(queryset) for name, queryset in querysets]
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for index in indexes:
+                    cursor.execute('DROP INDEX IF EXISTS {}'.format(index))
+            before = [explain_time(queryset) for name, queryset in querysets]
+            transaction.set_rollback(True)
+
+        self.stdout.write('{:<36} {:>12} {:>12} {:>9}'.format('filter', 'before ms', 'after ms', 'speedup'))
+        for (name, queryset), old, new in zip(querysets, before, after):
+            self.stdout.write('{:<36} {:>12.3f} {:>12.3f} {:>8.1f}x'.format(name, old, new, old / max(new, 0.001)))
+
+    def bench_cache(self, options):
+        owner = Construction.objects.values('owner_id').annotate(count=Count('id')).order_by('-count').first()
+        if owner is None:
+            raise CommandError('No data to benchmark, run generate_data --fast first')
+        user = CustomUser.objects.get(id=owner['owner_id'])
+        construction = Construction.objects.filter(owner=user).order_by('id').first()
+        client = APIClient()
+        client.force_authenticate(user)
+        urls = ['/api/constructions/', '/api/constructions/?page_size=1000',
+                '/api/constructions/%d/' % construction.id]
+
+        self.stdout.write('{} constructions owned by {}, {} requests per endpoint'.format(
+            owner['count'], user.email, options['requests']))
+        self.stdout.write('{:<40} {:>6} {:>10} {:>10}'.format('endpoint', 'cache', 'p50 ms', 'p99 ms'))
+        with override_settings(ALLOWED_HOSTS=['*']):
+            for url in urls:
+                for timeout in (0, 60):
+                    with override_settings(RESPONSE_CACHE_TIMEOUT=timeout):
+                        latencies = [timed(client.get, url)[1] * 1000 for _ in range(options['requests'])]
+                    self.stdout.write('{:<40} {:>6} {:>10.2f} {:>10.2f}'.format(
+                        url, 'on' if timeout else 'off', np.percentile(latencies, 50), np.percentile(latencies, 99)))
+
+    def bench_serializers(self, options):
+        rows = options['rows']
+        querysets = [
+            (ConstructionSerializer, Construction.objects.select_related('owner', 'roof', 'walls', 'floor',
+                                                                         'foundation')),
+            (MeasurementSerializer, Measurement.objects.all()),
+            (EvaluationSerializer, Evaluation.objects.all()),
+        ]
+        renderer = JSONRenderer()
+        self.stdout.write('{:<24} {:>8} {:>14} {:>14} {:>9}'.format(
+            'serializer', 'rows', 'rows/s', 'fast rows/s', 'speedup'))
+        for serializer_class, queryset in querysets:
+            queryset = queryset.order_by('pk')[:rows]
+            fast_serializer = FastSerializer(serializer_class)
+
+            def slow():
+                return renderer.render(serializer_class(list(queryset), many=True).data)
+
+            def fast():
+                return renderer.render(fast_serializer.bind(list(queryset.values(*fast_serializer.paths))).data)
+
+            expected, slow_time = timed(slow)
+            result, fast_time = timed(fast)
+            if result != expected:
+                raise CommandError('FastSerializer output differs from %s' % serializer_class.__name__)
+            count = len(queryset)
+            self.stdout.write('{:<24} {:>8,} {:>14,.0f} {:>14,.0f} {:>8.1f}x'.format(
+                serializer_class.__name__, count, count / slow_time, count / fast_time, slow_time / fast_time))
+
+    def bench_json(self, options):
+        rows = options['rows']
+        payloads = [
+            ('evaluations', FastSerializer(EvaluationSerializer), Evaluation.objects.all()),
+            ('predictions', None, Prediction.objects.all()),
+            ('constructions', FastSerializer(ConstructionSerializer), Construction.objects.all()),
+        ]
+        self.stdout.write('{:<28} {:>8} {:>12} {:>12} {:>9}'.format(
+            'payload', 'rows', 'stdlib ms', 'fast ms', 'speedup'))
+        for name, fast_serializer, queryset in payloads:
+            queryset = queryset.order_by('pk')[:rows]
+            if fast_serializer is None:
+                data = PredictionSerializer(queryset, many=True).data
+            else:
+                data = fast_serializer.bind(queryset.values(*fast_serializer.paths)).data
+            expected, slow_time = timed(JSONRenderer().render, data)
+            result, fast_time = timed(FastJSONRenderer().render, data)
+            if result != expected:
+                raise CommandError('FastJSONRenderer output differs for %s' % name)
+            self.stdout.write('{:<28} {:>8,} {:>12.1f} {:>12.1f} {:>8.1f}x'.format(
+                'render ' + name, len(data), slow_time * 1000, fast_time * 1000, slow_time / fast_time))
+
+            expected, slow_time = timed(JSONParser().parse, io.BytesIO(result))
+            parsed, fast_time = timed(FastJSONParser().parse, io.BytesIO(result))
+            if parsed != expected:
+                raise CommandError('FastJSONParser output differs for %s' % name)
+            self.stdout.write('{:<28} {:>8,} {:>12.1f} {:>12.1f} {:>8.1f}x'.format(
+                'parse ' + name, len(data), slow_time * 1000, fast_time * 1000, slow_time / fast_time))
+
+    def bench_partitions(self, options):
+        if not Measurement.objects.exists():
+            raise CommandError('No data to benchmark, run generate_data --fast first')
+        with connection.cursor() as cursor:
+            if not is_partitioned(cursor):
+                raise CommandError('The measurement table is not partitioned, run migrate first')
+            partitions = len(get_partitions(cursor)) + 1
+            cursor.execute('ANALYZE')
+        querysets = [(name, queryset) for name, queryset in filter_querysets()
+                     if name.startswith(('measurements date', 'measurements keyset', 'evaluations date'))]
+        measured = Measurement.objects.order_by('date').values_list('date', flat=True)
+        measured = measured[measured.count() // 2]
+        year_start = measured.replace(month=1, day=1)
+        querysets.append(('measurements year count', Measurement.objects.filter(
+            date__gte=year_start, date__lt=year_start.replace(year=year_start.year + 1))
+            .values('construction_id').annotate(count=Count('id'))))
+
+        # the same queries against an unpartitioned copy with the same indexes, rolled back afterwards
+        with transaction.atomic(), connection.cursor() as cursor:
+            statements = [queryset.query.sql_with_params() for name, queryset in querysets]
+            after = [explain_partitions(cursor, sql, params) for sql, params in statements]
+            cursor.execute('CREATE TABLE {0}_flat AS SELECT * FROM {0}'.format(TABLE))
+            cursor.execute('ALTER TABLE {}_flat ADD PRIMARY KEY (id)'.format(TABLE))
+            cursor.execute("SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+                           [TABLE, TABLE + '_pkey'])
+            for sql, in cursor.fetchall():
+                cursor.execute(re.sub(r'INDEX (\w+) ON ONLY (\S+) ', r'INDEX \1_flat ON \2_flat ', sql))
+            cursor.execute('ANALYZE {}_flat'.format(TABLE))
+            before = [explain_partitions(cursor, sql.replace('"{}"'.format(TABLE), '"{}_flat"'.format(TABLE)), params)
+                      for sql, params in statements]
+            transaction.set_rollback(True)
+
+        self.stdout.write('{} partitions'.format(partitions))
+        self.stdout.write('{:<32} {:>12} {:>12} {:>9} {:>9}'.format('query', 'flat ms', 'parted ms', 'speedup',
+                                                                      'scanned'))
+        for (name, queryset), (old, flat), (new, scanned) in zip(querysets, before, after):
+            self.stdout.write('{:<32} {:>12.3f} {:>12.3f} {:>8.1f}x {:>4}/{:<4}'.format(
+                name, old, new, old / max(new, 0.001), scanned, partitions))
+
+    def bench_connections(self, options):
+        construction = Construction.objects.order_by('id').first()
+        if construction is None:
+            raise CommandError('No data to benchmark, run generate_data --fast first')
+        client = APIClient()
+        client.force_authenticate(construction.owner)
+        url = '/api/constructions/%d/' % construction.id
+        variants = [('new connection per request', 0, False, 0), ('persistent', 60, False, 0)]
+        if isinstance(connections['default'], PooledDatabaseWrapper):
+            variants += [('persistent, health checks', 60, True, 0), ('pool', 0, False, 4),
+                         ('pool, health checks', 0, True, 4)]
+        else:
+            self.stdout.write('ENGINE is not building.db, skipping health checks and the pool')
+        backends = set()
+
+        def request():
+            # the test client leaves out what the request signals do with connections
+            close_old_connections()
+            client.get(url)
+            backends.add(connection.connection.get_backend_pid())
+            close_old_connections()
+
+        settings_dict = dict(connection.settings_dict)
+        self.stdout.write('{:<28} {:>10} {:>10} {:>10} {:>9}'.format('connections', 'p50 ms', 'p99 ms', 'saved ms',
+                                                                     'sessions'))
+        try:
+            with override_settings(ALLOWED_HOSTS=['*'], RESPONSE_CACHE_TIMEOUT=0):
+                baseline = None
+                for name, max_age, health_checks, pool_size in variants:
+                    connection.close()
+                    connection.settings_dict.update(CONN_MAX_AGE=max_age, CONN_HEALTH_CHECKS=health_checks,
+                                                    POOL=dict(settings_dict.get('POOL') or {}, MAX_SIZE=pool_size))
+                    request()
+                    backends.clear()
+                    latencies = [timed(request)[1] * 1000 for _ in range(options['requests'])]
+                    p50 = np.percentile(latencies, 50)
+                    baseline = p50 if baseline is None else baseline
+                    self.stdout.write('{:<28} {:>10.2f} {:>10.2f} {:>10.2f} {:>9}'.format(
+                        name, p50, np.percentile(latencies, 99), baseline - p50, len(backends)))
+        finally:
+            connection.close()
+            connection.settings_dict.update(settings_dict)
+
+    def bench_auth(self, options):
+        construction = Construction.objects.order_by('id').first()
+        if construction is None:
+            raise CommandError('No data to benchmark, run generate_data --fast first')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer %s' % construction.owner.token.access_token)
+        urls = ['/api/constructions/%d/' % construction.id, '/api/measurements/?page_size=10']
+        authentication_classes = APIView.authentication_classes
+
+        self.stdout.write('{:<40} {:<10} {:>10} {:>10} {:>12}'.format('endpoint', 'auth', 'p50 ms', 'p99 ms',
+                                                                      'user queries'))
+        try:
+            with override_settings(ALLOWED_HOSTS=['*'], RESPONSE_CACHE_TIMEOUT=0):
+                for url in urls:
+                    for name, authentication_class in [('database', JWTAuthentication),
+                                                       ('stateless', StatelessJWTAuthentication)]:
+                        APIView.authentication_classes = [authentication_class]
+                        client.get(url)
+                        with CaptureQueriesContext(connection) as queries:
+                            latencies = [timed(client.get, url)[1] * 1000 for _ in range(options['requests'])]
+                        user_queries = sum('FROM "building_customuser"' in query['sql'] for query in queries)
+                        self.stdout.write('{:<40} {:<10} {:>10.2f} {:>10.2f} {:>12.2f}'.format(
+                            url, name, np.percentile(latencies, 50), np.percentile(latencies, 99),
+                            user_queries / options['requests']))
+        finally:
+            APIView.authentication_classes = authentication_classes
+
+    def bench_blacklist(self, options):
+        rows, requests = options['rows'], options['requests']
+        expires_at = datetime.now(timezone.utc) + timedelta(days=1)
+
+        def check(token_class, token):
+            try:
+                token_class.check_blacklist(token)
+                return False
+            except TokenError:
+                return True
+
+        # a blacklist of ``rows`` tokens, rolled back afterwards
+        with transaction.atomic():
+            outstanding = OutstandingToken.objects.bulk_create(
+                OutstandingToken(jti=RefreshToken()['jti'], token='', expires_at=expires_at) for _ in range(rows))
+            BlacklistedToken.objects.bulk_create(BlacklistedToken(token=token) for token in outstanding)
+            blacklist_filter.clear()
+            _, warm_time = timed(blacklist_filter.sync)
+            self.stdout.write('{:,} blacklisted tokens, filter of {:,} bytes built in {:.1f} ms'.format(
+                rows, len(blacklist_filter.filter.bits), warm_time * 1000))
+
+            valid = [RefreshToken() for _ in range(requests)]
+            blacklisted = []
+            for token in random.sample(outstanding, min(requests, rows)):
+                blacklisted.append(RefreshToken())
+                blacklisted[-1]['jti'] = token.jti
+            self.stdout.write('{:<14} {:<10} {:>12} {:>12} {:>9}'.format('tokens', 'check', 'us/check', 'queries',
+                                                                        'refused'))
+            for name, checked in [('valid', valid), ('blacklisted', blacklisted)]:
+                for check_name, token_class in [('database', tokens.RefreshToken), ('filter', RefreshToken)]:
+                    with CaptureQueriesContext(connection) as queries:
+                        refused, elapsed = timed(lambda: sum(check(token_class, token) for token in checked))
+                    self.stdout.write('{:<14} {:<10} {:>12.1f} {:>12,} {:>9,}'.format(
+                        name, check_name, elapsed / len(checked) * 1e6, len(queries), refused))
+            transaction.set_rollback(True)
+        blacklist_filter.clear()
+
+    def bench_hashers(self, options):
+        passwords = ['password %d' % i for i in range(options['requests'])]
+        self.stdout.write('{:<16} {:>8} {:>12} {:>9}'.format('hasher', 'workers', 'hashes/s', 'speedup'))
+        for hasher in get_hashers():
+            try:
+                if hasher.library:
+                    hasher._load_library()
+            except ValueError:
+                self.stdout.write('{:<16} not installed'.format(hasher.algorithm))
+                continue
+            baseline = None
+            for workers in options['workers']:
+                # the worker processes are started before timing
+                hash_passwords(passwords[:workers], workers, hasher.algorithm)
+                _, elapsed = timed(hash_passwords, passwords, workers, hasher.algorithm)
+                rate = len(passwords) / elapsed
+                baseline = baseline or rate
+                self.stdout.write('{:<16} {:>8} {:>12,.1f} {:>8.1f}x'.format(
+                    hasher.algorithm, workers, rate, rate / baseline))
+
+    def bench_at_risk(self, options):
+        owner = Construction.objects.values('owner_id').annotate(count=Count('id')).order_by('-count').first()
+        if owner is None:
+            raise CommandError('No data to benchmark, run generate_data --fast first')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        related = ('owner', 'roof', 'walls', 'floor', 'foundation')
+        # what the rankings took before the latest values were kept on the construction
+        damage = Evaluation.objects.filter(measurement__construction_id=OuterRef('pk')).order_by(
+            '-measurement__date', '-measurement_id').values('construction_damage')[:1]
+        warning = Prediction.objects.filter(construction_id=OuterRef('pk')).order_by('-date', '-id').values(
+            'years_until_full_warning')[:1]
+        rankings = [
+            ('damage', '-construction_damage', Construction.objects.annotate(latest=Subquery(damage)).filter(
+                latest__isnull=False).order_by('-latest', 'id')),
+            ('warning', 'years_until_full_warning', Construction.objects.annotate(latest=Subquery(warning)).filter(
+                latest__isnull=False).order_by('latest', 'id')),
+        ]
+        scopes = [('owner', {'owner_id': owner['owner_id']}, owner['count']),
+                  ('all', {}, Construction.objects.count())]
+
+        self.stdout.write('top {} of {:,} constructions'.format(options['k'], scopes[1][2]))
+        self.stdout.write('{:<10} {:<8} {:>14} {:>12} {:>12} {:>9}'.format('by', 'scope', 'constructions',
+                                                                        'history ms', 'column ms', 'speedup'))
+        for by, ordering, history in rankings:
+            for scope, lookups, count in scopes:
+                column = Construction.objects.filter(**lookups, **{ordering.lstrip('-') + '__isnull': False})
+                old = explain_time(history.filter(**lookups).select_related(*related)[:options['k']])
+                new = explain_time(column.select_related(*related).order_by(ordering, 'id')[:options['k']])
+                self.stdout.write('{:<10} {:<8} {:>14,} {:>12.3f} {:>12.3f} {:>8.1f}x'.format(
+                    by, scope, count, old, new, old / max(new, 0.001)))
@@ -1,11 +1,18 @@
 import random
+from datetime import date
+from django.contrib.auth.hashers import make_password
 from django.core.management import BaseCommand
+from django.db import transaction
 from faker import Faker
+from ...ingest import copy_objects, evaluate_measurements, predict_constructions, update_latest_predictions
 from ...models import CustomUser, Construction, Roof, Foundation, Walls, Measurement, Evaluation, Prediction, Floor
 from ...predict import *
+from ...rollups import add_rollups
 
 
 fake = Faker()
+# fixed bounds so that seeded datasets do not depend on the day they are generated
+dates_range = (date(1970, 1, 1), date(2021, 12, 31))
 
 
 def get_user():
@@ -130,6 +137,51 @@ def get_prediction(construct, measurement):
         construction_damage_predicted=result['construction_damage_predicted'],
     )
     prediction_res.save()
+    update_latest_predictions([construction.id])
+
+
+def build_users(count):
+    password = make_password('user12345678')
+    return [CustomUser(first_name=fake.first_name(),
+                       last_name=fake.last_name(),
+                       email=fake.unique.email(),
+                       phone=fake.unique.phone_number(),
+                       password=password) for i in range(count)]
+
+
+def build_constructions(users, count):
+    return [Construction(name=fake.word(),
+                         address=fake.street_address(),
+                         construction_type=str(random.randint(1, 3)),
+                         height=random.randint(100, 9999),
+                         floor_number=random.randint(1, 10),
+                         build_date=fake.date_between_dates(*dates_range),
+                         total_area=random.randint(100, 9999),
+                         owner=random.choice(users)) for i in range(count)]
+
+
+def build_parts(construction):
+    return (Roof(construction=construction,
+                 roof_type=str(random.randint(1, 11)),
+                 roof_material=str(random.randint(1, 8))),
+            Walls(construction=construction,
+                  walls_material=str(random.randint(1, 8)),
+                  thickness=random.randint(100, 999)),
+            Floor(construction=construction,
+                  floor_type=str(random.randint(1, 8))),
+            Foundation(construction=construction,
+                       area=random.randint(100, 9999),
+                       foundation_type=str(random.randint(1, 6)),
+                       foundation_material=str(random.randint(1, 8))))
+
+
+def build_measurement(construction):
+    return Measurement(construction_id=construction.id,
+                       date=fake.date_between_dates(*dates_range),
+                       temperature=random.randint(0, 40),
+                       humidity=round(random.uniform(0, 1), 2),
+                       acoustic_analysis=round(random.uniform(0, 1), 2),
+                       vibration=round(random.uniform(0, 1), 2))
 
 
 class Command(BaseCommand):
@@ -139,8 +191,19 @@ class Command(BaseCommand):
         parser.add_argument('-u', '--users', nargs='+', type=int)
         parser.add_argument('-c', '--constructions', nargs='+', type=int)
         parser.add_argument('-e', '--evaluations', nargs='+', type=int)
+        parser.add_argument('--fast', action='store_true',
+                            help='Build objects in memory and insert them in chunks, bypassing signals')
+        parser.add_argument('--chunk-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, help='Seed the random generators to get a reproducible dataset')
 
     def handle(self, *args, **options):
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+            Faker.seed(options['seed'])
+            fake.unique.clear()
+        if options['fast']:
+            return self.handle_fast(options['users'][0], options['constructions'][0],
+                                    options['evaluations'][0], options['chunk_size'])
         users = []
         constructions = []
         for i in range(options['users'][0]):
@@ -156,3 +219,38 @@ class Command(BaseCommand):
                 measurement = get_measurement(construction)
                 if random.randint(0, 1):
                     get_prediction(construction, measurement)
+
+    def handle_fast(self, users_count, constructions_count, evaluations_count, chunk_size):
+        with transaction.atomic():
+            users = CustomUser.objects.bulk_create(build_users(users_count), batch_size=chunk_size)
+            constructions = Construction.objects.bulk_create(build_constructions(users, constructions_count),
+                                                             batch_size=chunk_size)
+            parts = list(zip(*[build_parts(construction) for construction in constructions]))
+            for model, objects in zip((Roof, Walls, Floor, Foundation), parts):
+                model.objects.bulk_create(objects, batch_size=chunk_size)
+        self.stdout.write('{:,} users and {:,} constructions created'.format(len(users), len(constructions)))
+
+        materials = {construction.id: (construction.owner_id, construction.build_date, roof.roof_material,
+                                       walls.walls_material, floor.floor_type, foundation.foundation_material)
+                     for construction, roof, walls, floor, foundation in zip(constructions, *parts)}
+        by_id = {construction.id: construction for construction in constructions}
+        measurements = []
+        predicted = []
+        created = 0
+        for construction in constructions:
+            for i in range(evaluations_count):
+                measurements.append(build_measurement(construction))
+                predicted.append(random.randint(0, 1))
+            if len(measurements) >= chunk_size or construction is constructions[-1]:
+                with transaction.atomic():
+                    copy_objects(Measurement, measurements)
+                    add_rollups(measurement.id for measurement in measurements)
+                    evaluations = evaluate_measurements(measurements, materials)
+                    predict_constructions((measurement.construction_id, evaluation.final_coefficient,
+                                           by_id[measurement.construction_id].build_date)
+                                          for measurement, evaluation, flag
+                                          in zip(measurements, evaluations, predicted) if flag)
+                created += len(measurements)
+                measurements = []
+                predicted = []
+                self.stdout.write('{:,} measurements created'.format(created))
@@ -0,0 +1,120 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+from django.core.exceptions import ValidationError
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from ...ingest import copy_objects, evaluate_measurements, load_construction_parts
+from ...models import ImportCheckpoint, Measurement
+from ...rollups import add_rollups
+
+
+FIELDS = [Measurement._meta.get_field(name)
+          for name in ['date', 'temperature', 'humidity', 'acoustic_analysis', 'vibration']]
+
+
+def read_rows(stream, file_format, offset=0):
+    if file_format == 'csv':
+        header = next(csv.reader([stream.readline().decode('utf-8-sig')]))
+        offset = max(offset, stream.tell())
+    stream.seek(offset)
+    for line in stream:
+        offset += len(line)
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            if file_format == 'csv':
+                row = dict(zip(header, next(csv.reader([line.decode('utf-8')]))))
+            else:
+                row = json.loads(line)
+        except ValueError as exc:
+            row = exc
+        yield offset, row
+
+
+def get_measurement(row):
+    if isinstance(row, Exception):
+        raise ValidationError(str(row))
+    if not isinstance(row, dict):
+        raise ValidationError('Expected an object.')
+    try:
+        values = {'construction_id': int(row.get('construction'))}
+    except (TypeError, ValueError):
+        raise ValidationError({'construction': 'A valid integer is required.'})
+    for field in FIELDS:
+        value = row.get(field.name)
+        if value in (None, ''):
+            if not field.has_default() and not getattr(field, 'auto_now_add', False):
+                raise ValidationError({field.name: 'This field is required.'})
+            value = field.get_default() if field.has_default() else None
+        else:
+            value = field.clean(str(value) if isinstance(value, float) else value, None)
+        values[field.attname] = value
+    return Measurement(**values)
+
+
+class Command(BaseCommand):
+    help = 'Imports measurements from a CSV or NDJSON archive in chunks, resuming interrupted imports'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('-f', '--format', choices=['csv', 'ndjson'])
+        parser.add_argument('-s', '--chunk-size', type=int, default=10000)
+        parser.add_argument('--restart', action='store_true', help='Ignore the saved offset and start over')
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        checkpoint, created = ImportCheckpoint.objects.get_or_create(source=path)
+        if options['restart']:
+            checkpoint.offset = checkpoint.rows = 0
+        if checkpoint.offset:
+            self.stdout.write('Resuming {} at byte {:,} ({:,} rows already imported)'.format(
+                path, checkpoint.offset, checkpoint.rows))
+
+        try:
+            stream = open(path, 'rb')
+        except OSError as exc:
+            raise CommandError(exc)
+        with stream:
+            rows = read_rows(stream, file_format, checkpoint.offset)
+            started = time.perf_counter()
+            imported = skipped = 0
+            while True:
+                chunk = list(islice(rows, options['chunk_size']))
+                if not chunk:
+                    break
+                measurements = []
+                for offset, row in chunk:
+                    try:
+                        measurements.append(get_measurement(row))
+                    except ValidationError as exc:
+                        skipped += 1
+                        self.stderr.write('Skipped row ending at byte {}: {}'.format(offset, '; '.join(exc.messages)))
+                parts = load_construction_parts(measurement.construction_id for measurement in measurements)
+                valid = []
+                for measurement in measurements:
+                    if None in parts.get(measurement.construction_id, (None,)):
+                        skipped += 1
+                        self.stderr.write('Skipped row for construction {}: unknown construction or missing parts'
+                                          .format(measurement.construction_id))
+                    else:
+                        valid.append(measurement)
+
+                with transaction.atomic():
+                    copy_objects(Measurement, valid)
+                    add_rollups(measurement.id for measurement in valid)
+                    evaluate_measurements(valid, parts)
+                    checkpoint.offset = chunk[-1][0]
+                    checkpoint.rows += len(valid)
+                    checkpoint.save()
+
+                imported += len(valid)
+                elapsed = time.perf_counter() - started
+                self.stdout.write('{:,} rows imported, {:,} skipped, byte {:,}, {:,.0f} rows/s'.format(
+                    imported, skipped, checkpoint.offset, (imported + skipped) / elapsed))
+        self.stdout.write(self.style.SUCCESS('Imported {:,} rows from {} ({:,} in total)'.format(
+            imported, path, checkpoint.rows)))
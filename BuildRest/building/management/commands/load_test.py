@@ -0,0 +1,98 @@
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+import numpy as np
+from django.core.management import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+from ...models import Construction, CustomUser
+
+
+async def request(url, method, headers, body, slow, timeout):
+    # one request on its own connection, sending the body in pieces over ``slow`` seconds like a gateway on a poor link
+    parts = urlsplit(url)
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(parts.hostname, parts.port or 80), timeout)
+    try:
+        head = ['{} {} HTTP/1.1'.format(method, parts.path + ('?' + parts.query if parts.query else '')),
+                'Host: {}'.format(parts.netloc), 'Connection: close', 'Content-Length: {}'.format(len(body))]
+        writer.write(('\r\n'.join(head + headers) + '\r\n\r\n').encode('latin-1'))
+        pieces = 10 if slow and body else 1
+        size = -(-len(body) // pieces)
+        for i in range(pieces):
+            if slow and body:
+                await asyncio.sleep(slow / pieces)
+            writer.write(body[i * size:(i + 1) * size])
+            await writer.drain()
+        status = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        return int(status.split()[1])
+    finally:
+        writer.close()
+
+
+async def connection(url, method, headers, body, slow, timeout, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            status = await request(url, method, headers, body, slow, timeout)
+        except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+            status = None
+        if status is not None and status < 400:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors.append(status)
+
+
+async def load(url, method, headers, body, slow, timeout, connections, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*[connection(url, method, headers, body, slow, timeout, deadline, latencies, errors)
+                           for _ in range(connections)])
+    return latencies, errors
+
+
+class Command(BaseCommand):
+    help = ('Keeps many concurrent connections busy against running servers and reports what each completed, '
+            'e.g. "load_test wsgi=http://127.0.0.1:8000/api/measurements/ '
+            'asgi=http://127.0.0.1:8001/api/async/measurements/" with gunicorn BuildRest.wsgi on port 8000 and '
+            'uvicorn BuildRest.asgi:application on port 8001')
+
+    def add_arguments(self, parser):
+        parser.add_argument('targets', nargs='+', metavar='NAME=URL')
+        parser.add_argument('-c', '--connections', type=int, nargs='+', default=[10, 100])
+        parser.add_argument('-d', '--duration', type=float, default=10, help='Seconds per target and connection count')
+        parser.add_argument('-X', '--method', choices=['GET', 'POST'], default='POST')
+        parser.add_argument('--slow', type=float, default=0, help='Seconds taken to send each request body')
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--user', help='Email of the user to send as, the first superuser by default')
+
+    def handle(self, *args, **options):
+        targets = [target.partition('=')[::2] for target in options['targets']]
+        if any(not name or not url.startswith('http://') for name, url in targets):
+            raise CommandError('Targets are NAME=http://host:port/path')
+        users = CustomUser.objects.order_by('id')
+        user = users.filter(email=options['user']).first() if options['user'] else users.filter(
+            is_superuser=True).first()
+        if user is None:
+            raise CommandError('No such user')
+        headers = ['Authorization: Bearer {}'.format(RefreshToken.for_user(user).access_token)]
+        body = b''
+        if options['method'] == 'POST':
+            construction = Construction.objects.filter(owner=user).exclude(roof=None).exclude(walls=None).exclude(
+                floor=None).exclude(foundation=None).values_list('id', flat=True).first()
+            if construction is None:
+                raise CommandError('{} has no construction to post measurements for'.format(user.email))
+            body = json.dumps({'construction': construction, 'temperature': 20, 'humidity': 0.5,
+                               'acoustic_analysis': 0.25, 'vibration': 0.125}).encode()
+            headers.append('Content-Type: application/json')
+
+        self.stdout.write('{:<12} {:>6} {:>9} {:>8} {:>10} {:>10} {:>10}'.format(
+            'target', 'conns', 'ok', 'errors', 'req/s', 'p50 ms', 'p99 ms'))
+        for name, url in targets:
+            for connections in options['connections']:
+                latencies, errors = asyncio.run(load(url, options['method'], headers, body, options['slow'],
+                                                     options['timeout'], connections, options['duration']))
+                percentiles = np.percentile(latencies, [50, 99]) * 1000 if latencies else [0, 0]
+                self.stdout.write('{:<12} {:>6} {:>9,} {:>8,} {:>10,.1f} {:>10.1f} {:>10.1f}'.format(
+                    name, connections, len(latencies), len(errors), len(latencies) / options['duration'],
+                    *percentiles))
@@ -0,0 +1,34 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from ...partitions import archive_partition, create_partitions, get_partitions, is_partitioned, partition_name
+
+
+class Command(BaseCommand):
+    help = 'Creates the yearly measurement partitions ahead of time and detaches or drops old ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=2, help='Years past the current one to create partitions for')
+        parser.add_argument('--archive-before', type=int, metavar='YEAR',
+                            help='Detach the partitions of the years before this one, keeping them as plain tables')
+        parser.add_argument('--drop', action='store_true', help='Drop the partitions detached by --archive-before')
+
+    def handle(self, *args, **options):
+        if options['ahead'] < 0:
+            raise CommandError('--ahead must not be negative')
+        if options['drop'] and options['archive_before'] is None:
+            raise CommandError('--drop needs --archive-before')
+        with transaction.atomic(), connection.cursor() as cursor:
+            if not is_partitioned(cursor):
+                raise CommandError('The measurement table is not partitioned, run migrate first')
+            for year in create_partitions(cursor, options['ahead']):
+                self.stdout.write('Created {}'.format(partition_name(year)))
+
+        if options['archive_before'] is not None:
+            with connection.cursor() as cursor:
+                years = [year for year in sorted(get_partitions(cursor)) if year < options['archive_before']]
+            for year in years:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    constructions = archive_partition(cursor, year, options['drop'])
+                self.stdout.write('{} {} ({:,} constructions)'.format(
+                    'Dropped' if options['drop'] else 'Detached', partition_name(year), constructions))
+        self.stdout.write(self.style.SUCCESS('Measurement partitions are up to date'))
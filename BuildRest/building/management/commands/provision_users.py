@@ -0,0 +1,61 @@
+import csv
+import time
+from itertools import islice
+from django.core.management import BaseCommand, CommandError
+from faker import Faker
+from ...users import provision_users
+
+
+def fake_users(count, password):
+    # unique emails and phones, as Faker repeats itself over a few thousand rows
+    fake = Faker()
+    for i in range(count):
+        yield {'first_name': fake.first_name(), 'last_name': fake.last_name(),
+               'email': '{}.{}'.format(i, fake.email()), 'phone': '{}-{}'.format(i, fake.phone_number())[:50],
+               'password': password}
+
+
+class Command(BaseCommand):
+    help = ('Creates users in bulk, hashing their passwords in parallel: from a CSV file with email, password, '
+            'first_name, last_name and phone columns, or --fake users that all have --password')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?')
+        parser.add_argument('--fake', type=int, metavar='COUNT')
+        parser.add_argument('--password', default='user12345678', help='Password of the --fake users')
+        parser.add_argument('-w', '--workers', type=int, help='Hashing processes, PASSWORD_HASH_WORKERS by default')
+        parser.add_argument('-s', '--chunk-size', type=int, default=1000, help='Users created per transaction')
+        parser.add_argument('--hasher', default='default',
+                            help='Algorithm of one of the PASSWORD_HASHERS, the first one by default')
+
+    def handle(self, *args, **options):
+        if bool(options['path']) == bool(options['fake']):
+            raise CommandError('Give either a CSV file or --fake COUNT')
+        if options['fake']:
+            self.provision(fake_users(options['fake'], options['password']), options)
+            return
+        try:
+            stream = open(options['path'], newline='', encoding='utf-8-sig')
+        except OSError as exc:
+            raise CommandError(exc)
+        with stream:
+            self.provision(csv.DictReader(stream), options)
+
+    def provision(self, rows, options):
+        started = time.perf_counter()
+        created = skipped = 0
+        while True:
+            chunk = list(islice(rows, options['chunk_size']))
+            if not chunk:
+                break
+            try:
+                users, errors = provision_users(chunk, options['workers'], options['hasher'])
+            except ValueError as exc:
+                raise CommandError(exc)
+            for error in errors:
+                self.stderr.write('Skipped row {}: {}'.format(created + skipped + error['index'] + 1, error['errors']))
+            created += len(users)
+            skipped += len(errors)
+            self.stdout.write('{:,} users created, {:,} skipped, {:,.1f} users/s'.format(
+                created, skipped, created / (time.perf_counter() - started)))
+        self.stdout.write(self.style.SUCCESS('Created {:,} users'.format(created)))
@@ -0,0 +1,32 @@
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+# both go in one statement, the blacklist entries would otherwise be collected and deleted one by one
+PRUNE_SQL = (
+    'WITH expired AS (SELECT id FROM {outstanding} WHERE expires_at <= %s ORDER BY id LIMIT %s), '
+    'blacklisted AS (DELETE FROM {blacklisted} b USING expired e WHERE b.token_id = e.id) '
+    'DELETE FROM {outstanding} o USING expired e WHERE o.id = e.id'
+).format(outstanding=OutstandingToken._meta.db_table, blacklisted=BlacklistedToken._meta.db_table)
+
+
+class Command(BaseCommand):
+    help = 'Deletes the expired outstanding and blacklisted tokens of the token_blacklist app in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-s', '--chunk-size', type=int, default=10000,
+                            help='Number of outstanding tokens deleted per transaction')
+
+    def handle(self, *args, **options):
+        now = aware_utcnow()
+        deleted = 0
+        while True:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(PRUNE_SQL, [now, options['chunk_size']])
+                rows = cursor.rowcount
+            deleted += rows
+            if rows < options['chunk_size']:
+                break
+            self.stdout.write('{:,} tokens deleted'.format(deleted))
+        self.stdout.write(self.style.SUCCESS('Deleted {:,} expired tokens'.format(deleted)))
@@ -0,0 +1,22 @@
+from itertools import islice
+from django.core.management import BaseCommand
+from ...ingest import update_latest_evaluations
+from ...models import Construction
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the cached latest evaluation of every construction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-s', '--chunk-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        ids = Construction.objects.order_by('id').values_list('id', flat=True).iterator(options['chunk_size'])
+        updated = 0
+        while True:
+            chunk = list(islice(ids, options['chunk_size']))
+            if not chunk:
+                break
+            updated += update_latest_evaluations(chunk)
+            self.stdout.write('{:,} constructions updated'.format(updated))
+        self.stdout.write(self.style.SUCCESS('Rebuilt the latest evaluation of {:,} constructions'.format(updated)))
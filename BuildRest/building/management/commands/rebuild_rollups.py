@@ -0,0 +1,27 @@
+from itertools import islice
+from django.core.management import BaseCommand
+from django.db import transaction
+from ...models import Construction
+from ...rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the daily, weekly and monthly measurement rollups of every construction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-s', '--chunk-size', type=int, default=1000,
+                            help='Number of constructions rebuilt per transaction')
+
+    def handle(self, *args, **options):
+        ids = Construction.objects.order_by('id').values_list('id', flat=True).iterator(options['chunk_size'])
+        constructions = rows = 0
+        while True:
+            chunk = list(islice(ids, options['chunk_size']))
+            if not chunk:
+                break
+            with transaction.atomic():
+                rows += rebuild_rollups(chunk)
+            constructions += len(chunk)
+            self.stdout.write('{:,} constructions rebuilt'.format(constructions))
+        self.stdout.write(self.style.SUCCESS('Rebuilt {:,} rollup rows for {:,} constructions'.format(
+            rows, constructions)))
@@ -0,0 +1,83 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from itertools import islice
+from django.core.management import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Value
+from django.db.models.functions import Mod
+from ...evaluate import evaluate_batch
+from ...ingest import update_latest_evaluations, update_objects
+from ...models import Construction, Evaluation
+
+
+FIELDS = ['roof_mark', 'walls_mark', 'floor_mark', 'foundation_mark', 'construction_reliability',
+          'construction_damage', 'final_coefficient']
+COLUMNS = ['id', 'latest_evaluation_id', 'build_date', 'roof__roof_material', 'walls__walls_material',
+           'floor__floor_type', 'foundation__foundation_material', 'latest_evaluation__measurement__humidity',
+           'latest_evaluation__measurement__acoustic_analysis', 'latest_evaluation__measurement__vibration'] + [
+          'latest_evaluation__' + field for field in FIELDS]
+
+
+def reevaluate(partition=0, partitions=1, chunk_size=10000, date_current=None):
+    constructions = Construction.objects.exclude(latest_evaluation=None)
+    if partitions > 1:
+        constructions = constructions.annotate(partition=Mod('id', Value(partitions))).filter(partition=partition)
+    rows = constructions.values_list(*COLUMNS).iterator(chunk_size)
+    checked = updated = 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        checked += len(chunk)
+        chunk = [row for row in chunk if None not in row[3:7]]
+        if not chunk:
+            continue
+        result = evaluate_batch([row[1] for row in chunk], [row[2] for row in chunk],
+                                [[row[i] for row in chunk] for i in range(3, 7)],
+                                [row[7] for row in chunk], [row[8] for row in chunk], [row[9] for row in chunk],
+                                date_current)
+        columns = [result[field].tolist() for field in FIELDS]
+
+        changed = []
+        for i, row in enumerate(chunk):
+            values = [column[i] for column in columns]
+            if values != [float(value) for value in row[10:]]:
+                changed.append((row[0], Evaluation(measurement_id=row[1], **dict(zip(FIELDS, values)))))
+        if changed:
+            with transaction.atomic():
+                update_objects(Evaluation, [evaluation for id, evaluation in changed], FIELDS)
+                update_latest_evaluations(id for id, evaluation in changed)
+        updated += len(changed)
+    return checked, updated
+
+
+class Command(BaseCommand):
+    help = "Recomputes every construction's latest evaluation for the current building age"
+
+    def add_arguments(self, parser):
+        parser.add_argument('-s', '--chunk-size', type=int, default=10000)
+        parser.add_argument('-w', '--workers', type=int, default=1,
+                            help='Number of processes, each handling the constructions with id %% workers == n')
+        parser.add_argument('--date', type=date.fromisoformat, help='Evaluate as of this date instead of today')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1 or options['chunk_size'] < 1:
+            raise CommandError('--workers and --chunk-size must be positive')
+        started = time.perf_counter()
+        if workers == 1:
+            results = [reevaluate(0, 1, options['chunk_size'], options['date'])]
+        else:
+            # the forked workers must not share the parent's database connection
+            connections.close_all()
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+                results = list(pool.map(reevaluate, range(workers), [workers] * workers,
+                                        [options['chunk_size']] * workers, [options['date']] * workers))
+        checked = sum(result[0] for result in results)
+        updated = sum(result[1] for result in results)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            '{:,} evaluations checked, {:,} updated in {:.1f}s ({:,.0f} rows/s)'.format(
+                checked, updated, elapsed, checked / elapsed if elapsed else 0)))
@@ -0,0 +1,44 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
+from ...tasks import run_evaluation_batch
+
+
+def work(batch_size, poll, once):
+    processed = 0
+    while True:
+        count = run_evaluation_batch(batch_size)
+        processed += count
+        if not count:
+            if once:
+                return processed
+            time.sleep(poll)
+
+
+class Command(BaseCommand):
+    help = 'Evaluates the queued measurements, for EVALUATION_MODE=queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-w', '--workers', type=int, default=1)
+        parser.add_argument('-b', '--batch-size', type=int, default=500, help='Measurements claimed per transaction')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers and --batch-size must be positive')
+        started = time.perf_counter()
+        arguments = (options['batch_size'], options['poll'], options['once'])
+        if workers == 1:
+            processed = work(*arguments)
+        else:
+            # the forked workers must not share the parent's database connection
+            connections.close_all()
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+                processed = sum(future.result() for future in [pool.submit(work, *arguments) for _ in range(workers)])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            '{:,} queued measurements processed in {:.1f}s'.format(processed, elapsed)))
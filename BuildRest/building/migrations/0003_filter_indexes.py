@@ -0,0 +1,72 @@
+# Generated by Django 3.2 on 2026-10-18 13:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# icontains compiles to UPPER(column::text) LIKE UPPER(...) on PostgreSQL,
+# so the trigram indexes have to be built on that same expression
+trigram_indexes = [
+    ('construction_name_trgm_idx', 'building_construction', 'name'),
+    ('construction_address_trgm_idx', 'building_construction', 'address'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # a missing extension fails here unless the indexes were turned off with TRIGRAM_INDEXES
+    if not settings.TRIGRAM_INDEXES:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for name, table, column in trigram_indexes:
+            cursor.execute('CREATE INDEX {} ON {} USING gin ((UPPER({}::text)) gin_trgm_ops)'.format(
+                name, table, column))
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for name, table, column in trigram_indexes:
+            cursor.execute('DROP INDEX IF EXISTS {}'.format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0002_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='construction',
+            index=models.Index(fields=['owner', 'build_date'], name='construction_owner_build_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='construction',
+            index=models.Index(fields=['owner', 'height'], name='construction_owner_height_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='construction',
+            index=models.Index(fields=['build_date'], name='construction_build_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='construction',
+            index=models.Index(fields=['height'], name='construction_height_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(fields=['construction', 'date'], name='measurement_construction_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(fields=['date', 'id'], name='measurement_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prediction',
+            index=models.Index(fields=['construction', 'date'], name='prediction_construction_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prediction',
+            index=models.Index(fields=['date', 'id'], name='prediction_date_id_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.2 on 2026-10-18 13:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0003_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='construction',
+            name='construction_damage',
+            field=models.DecimalField(blank=True, decimal_places=3, max_digits=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='construction',
+            name='construction_reliability',
+            field=models.DecimalField(blank=True, decimal_places=3, max_digits=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='construction',
+            name='final_coefficient',
+            field=models.DecimalField(blank=True, decimal_places=3, max_digits=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='construction',
+            name='latest_evaluation',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='building.evaluation'),
+        ),
+        # copied from the evaluation of the latest measurement of every construction
+        migrations.RunSQL(
+            'UPDATE building_construction c SET latest_evaluation_id = e.measurement_id, '
+            'construction_reliability = e.construction_reliability, construction_damage = e.construction_damage, '
+            'final_coefficient = e.final_coefficient '
+            'FROM (SELECT DISTINCT ON (m.construction_id) m.construction_id, e.measurement_id, '
+            'e.construction_reliability, e.construction_damage, e.final_coefficient '
+            'FROM building_evaluation e JOIN building_measurement m ON m.id = e.measurement_id '
+            'ORDER BY m.construction_id, m.date DESC, m.id DESC) e WHERE e.construction_id = c.id',
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.2 on 2026-10-18 13:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0005_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeasurementRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('start', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('temperature_sum', models.DecimalField(decimal_places=3, max_digits=100)),
+                ('temperature_min', models.DecimalField(decimal_places=3, max_digits=100)),
+                ('temperature_max', models.DecimalField(decimal_places=3, max_digits=100)),
+                ('humidity_sum', models.DecimalField(decimal_places=2, max_digits=100)),
+                ('humidity_min', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('humidity_max', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('acoustic_analysis_sum', models.DecimalField(decimal_places=2, max_digits=100)),
+                ('acoustic_analysis_min', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('acoustic_analysis_max', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('vibration_sum', models.DecimalField(decimal_places=3, max_digits=100)),
+                ('vibration_min', models.DecimalField(decimal_places=3, max_digits=100)),
+                ('vibration_max', models.DecimalField(decimal_places=3, max_digits=100)),
+                ('construction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='building.construction')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='measurementrollup',
+            constraint=models.UniqueConstraint(fields=('construction', 'bucket', 'start'), name='measurement_rollup_unique'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+from datetime import date
+from django.db import migrations, models
+import django.db.models.deletion
+
+# the SQL that swaps building_measurement for a copy partitioned by year (or back) lives here rather
+# than in the app, so that later changes to the app do not change what this migration does
+
+TABLE = 'building_measurement'
+DEFAULT = TABLE + '_default'
+
+
+def create_partitions(cursor, source, ahead=2):
+    cursor.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                   "WHERE i.inhparent = %s::regclass", [TABLE])
+    existing = {name for name, in cursor.fetchall()}
+    cursor.execute('SELECT DISTINCT extract(year FROM date)::integer FROM {}'.format(source))
+    years = {year for year, in cursor.fetchall()} | set(range(date.today().year, date.today().year + ahead + 1))
+    for year in sorted(years):
+        name = '%s_y%d' % (TABLE, year)
+        if name in existing:
+            continue
+        cursor.execute('CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS)'.format(name, TABLE))
+        cursor.execute('WITH moved AS (DELETE FROM {} WHERE date >= %s AND date < %s RETURNING *) '
+                       'INSERT INTO {} SELECT * FROM moved'.format(DEFAULT, name),
+                       [date(year, 1, 1), date(year + 1, 1, 1)])
+        cursor.execute('ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)'.format(TABLE, name),
+                       [date(year, 1, 1), date(year + 1, 1, 1)])
+
+
+def rebuild_table(cursor, partitioned):
+    cursor.execute("SELECT replace(indexdef, ' ON ONLY ', ' ON ') FROM pg_indexes "
+                   "WHERE tablename = %s AND indexname <> %s", [TABLE, TABLE + '_pkey'])
+    indexes = [sql for sql, in cursor.fetchall()]
+    cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                   "WHERE conrelid = %s::regclass AND contype = 'f'", [TABLE])
+    constraints = cursor.fetchall()
+    cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [TABLE, 'id'])
+    sequence = cursor.fetchone()[0]
+
+    cursor.execute('ALTER TABLE {0} RENAME TO {0}_old'.format(TABLE))
+    cursor.execute('CREATE TABLE {0} (LIKE {0}_old INCLUDING DEFAULTS){1}'.format(
+        TABLE, ' PARTITION BY RANGE (date)' if partitioned else ''))
+    cursor.execute('ALTER SEQUENCE {} OWNED BY {}.id'.format(sequence, TABLE))
+    if partitioned:
+        cursor.execute('CREATE TABLE {} PARTITION OF {} DEFAULT'.format(DEFAULT, TABLE))
+        create_partitions(cursor, TABLE + '_old')
+    cursor.execute('INSERT INTO {0} SELECT * FROM {0}_old'.format(TABLE))
+    cursor.execute('DROP TABLE {}_old CASCADE'.format(TABLE))
+
+    cursor.execute('ALTER TABLE {0} ADD CONSTRAINT {0}_pkey PRIMARY KEY ({1})'.format(
+        TABLE, 'id, date' if partitioned else 'id'))
+    for sql in indexes:
+        cursor.execute(sql)
+    for name, definition in constraints:
+        cursor.execute('ALTER TABLE {} ADD CONSTRAINT {} {}'.format(TABLE, name, definition))
+
+
+def partition(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        rebuild_table(cursor, partitioned=True)
+
+
+def unpartition(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        rebuild_table(cursor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0006_measurement_rollup'),
+    ]
+
+    operations = [
+        # a partitioned table cannot be referenced by a key that does not hold the partition column
+        migrations.AlterField(
+            model_name='evaluation',
+            name='measurement',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE,
+                                       primary_key=True, serialize=False, to='building.measurement'),
+        ),
+        migrations.RunPython(partition, unpartition),
+    ]
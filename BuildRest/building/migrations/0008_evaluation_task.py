@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-18 13:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0007_partition_measurement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EvaluationTask',
+            fields=[
+                ('measurement', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='building.measurement')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('failed', 'Failed')], default='pending', max_length=7)),
+                ('attempts', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='evaluationtask',
+            index=models.Index(condition=models.Q(status='pending'), fields=['measurement'], name='evaluation_task_pending_idx'),
+        ),
+    ]
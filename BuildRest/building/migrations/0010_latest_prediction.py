@@ -0,0 +1,41 @@
+# Generated by Django 3.2 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0009_user_tokens_valid_after'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='construction',
+            name='years_until_full_warning',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=100, null=True),
+        ),
+        # copied from the latest prediction of every construction before the indexes are built
+        migrations.RunSQL(
+            'UPDATE building_construction c SET years_until_full_warning = p.years_until_full_warning '
+            'FROM (SELECT DISTINCT ON (construction_id) construction_id, years_until_full_warning '
+            'FROM building_prediction ORDER BY construction_id, date DESC, id DESC) p WHERE p.construction_id = c.id',
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='construction',
+            index=models.Index(condition=models.Q(construction_damage__isnull=False), fields=['owner', '-construction_damage', 'id'], name='construction_owner_damage_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='construction',
+            index=models.Index(condition=models.Q(construction_damage__isnull=False), fields=['-construction_damage', 'id'], name='construction_damage_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='construction',
+            index=models.Index(condition=models.Q(years_until_full_warning__isnull=False), fields=['owner', 'years_until_full_warning', 'id'], name='construction_owner_warning_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='construction',
+            index=models.Index(condition=models.Q(years_until_full_warning__isnull=False), fields=['years_until_full_warning', 'id'], name='construction_warning_idx'),
+        ),
+    ]
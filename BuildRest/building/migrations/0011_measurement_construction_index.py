@@ -0,0 +1,32 @@
+# Generated by Django 3.2 on 2026-10-18 14:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0010_latest_prediction'),
+    ]
+
+    operations = [
+        # AlterField would also drop and re-add the foreign key, checking every measurement again
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'DROP INDEX IF EXISTS building_measurement_construction_id_fe99850e',
+                    'CREATE INDEX building_measurement_construction_id_fe99850e '
+                    'ON building_measurement (construction_id)',
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='measurement',
+                    name='construction',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE,
+                                            to='building.construction'),
+                ),
+            ],
+        ),
+    ]
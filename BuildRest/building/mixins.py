@@ -0,0 +1,190 @@
+import hashlib
+import json
+from importlib.util import find_spec
+from itertools import islice
+from django.conf import settings
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from .cache import get_versions, response_key
+from .export import write_csv, write_ndjson, write_parquet
+from .serializers import FastSerializer
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+def get_not_modified(request, response):
+    # the 304 (or 412) response keeps the validators of ``response``
+    last_modified = response.get('Last-Modified')
+    result = get_conditional_response(request, etag=response.get('ETag'),
+                                      last_modified=last_modified and parse_http_date(last_modified),
+                                      response=response)
+    return None if result is response else result
+
+
+class ConditionalGetMixin:
+    """
+    Adds a strong ETag and Last-Modified to list and retrieve responses, built from the
+    ``updated_at`` of the rows being returned, and answers If-None-Match / If-Modified-Since
+    with 304 Not Modified before anything is serialized.
+    """
+    updated_field = 'updated_at'
+
+    def get_validators(self, objects, extra=None):
+        fields = [self.get_queryset().model._meta.pk.attname, self.updated_field]
+        rows = [[obj[field] if isinstance(obj, dict) else getattr(obj, field) for field in fields] for obj in objects]
+        last_modified = max((updated_at for pk, updated_at in rows), default=None)
+        key = json.dumps([self.request.get_full_path(), self.request.accepted_media_type, extra, rows], default=str)
+        return '"%s"' % hashlib.md5(key.encode('utf-8')).hexdigest(), last_modified
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        response = set_validators(Response(), *self.get_validators([instance]))
+        not_modified = get_not_modified(request, response)
+        if not_modified is not None:
+            return not_modified
+        response.data = self.get_serializer(instance).data
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            objects, extra = list(queryset), None
+        else:
+            # count and links, so the tag also changes when rows outside this page come or go
+            objects, extra = page, self.paginator.get_paginated_response([]).data
+        response = set_validators(Response(), *self.get_validators(objects, extra))
+        not_modified = get_not_modified(request, response)
+        if not_modified is not None:
+            return not_modified
+        serializer = self.get_serializer(objects, many=True)
+        if page is None:
+            response.data = serializer.data
+        else:
+            response.data = self.get_paginated_response(serializer.data).data
+        return response
+
+
+class FastListMixin:
+    """
+    Serves list actions from ``values()`` rows rendered by a FastSerializer compiled
+    from ``fast_serializer_class``, when the FAST_LIST_SERIALIZERS setting is on.
+    """
+    fast_serializer_class = None
+
+    def get_fast_serializer(self):
+        if not settings.FAST_LIST_SERIALIZERS or self.action != 'list' or self.fast_serializer_class is None:
+            return None
+        view = type(self)
+        if view.__dict__.get('_fast_serializer') is None:
+            view._fast_serializer = FastSerializer(self.fast_serializer_class)
+        return view._fast_serializer
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fast_serializer = self.get_fast_serializer()
+        if fast_serializer is None:
+            return queryset
+        # the keyset pagination and the conditional GET read these back from the rows
+        fields = [queryset.model._meta.pk.attname, getattr(self, 'updated_field', None)]
+        fields += [field for field in getattr(self, 'keyset_ordering', getattr(self.paginator, 'ordering', ()))
+                   if '__' not in field]
+        fields = [field for field in fields if field is not None and field not in fast_serializer.paths]
+        return queryset.values(*fast_serializer.paths, *dict.fromkeys(fields))
+
+    def get_serializer(self, *args, **kwargs):
+        fast_serializer = self.get_fast_serializer()
+        if fast_serializer is None or not kwargs.get('many'):
+            return super().get_serializer(*args, **kwargs)
+        return fast_serializer.bind(args[0])
+
+
+class CachedResponseMixin:
+    """
+    Caches the data of successful list and retrieve responses per user and query string
+    for ``RESPONSE_CACHE_TIMEOUT`` seconds, see ``building.cache`` for the invalidation.
+    """
+
+    def get_cache_scopes(self):
+        if self.action == 'retrieve':
+            return ['construction:%s' % self.kwargs[self.lookup_url_kwarg or self.lookup_field]]
+        if self.request.user.is_superuser:
+            return ['all']
+        return ['owner:%s' % self.request.user.id]
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        timeout = settings.RESPONSE_CACHE_TIMEOUT
+        if not timeout:
+            return handler(request, *args, **kwargs)
+        key = response_key(request, get_versions(self.get_cache_scopes()))
+        cached = cache.get(key)
+        if cached is not None:
+            data, headers = cached
+            response = Response(data, headers=headers)
+            return get_not_modified(request, response) or response
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            headers = {header: response[header] for header in ('ETag', 'Last-Modified') if response.has_header(header)}
+            cache.set(key, (response.data, headers), timeout)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super().retrieve, request, *args, **kwargs)
+
+
+class ExportMixin:
+    """
+    Adds an ``export`` action that streams every filtered row as CSV, NDJSON or Parquet
+    (``?output=``), reading them through a server-side cursor ``export_chunk_size`` at a time.
+    ``export_fields`` lists the (column, lookup) pairs to write.
+    """
+    export_fields = ()
+    export_chunk_size = 2000
+    export_outputs = {
+        'csv': 'text/csv',
+        'ndjson': 'application/x-ndjson',
+        'parquet': 'application/vnd.apache.parquet',
+    }
+
+    def get_export_chunks(self, queryset, lookups):
+        rows = queryset.order_by('pk').values_list(*lookups).iterator(chunk_size=self.export_chunk_size)
+        while True:
+            chunk = list(islice(rows, self.export_chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        output = request.query_params.get('output', 'csv')
+        if output not in self.export_outputs:
+            raise ValidationError({'output': ['Choose one of: %s.' % ', '.join(self.export_outputs)]})
+        queryset = self.filter_queryset(self.get_queryset())
+        names = [name for name, lookup in self.export_fields]
+        lookups = [lookup for name, lookup in self.export_fields]
+        chunks = self.get_export_chunks(queryset, lookups)
+        if output == 'csv':
+            content = write_csv(names, chunks)
+        elif output == 'ndjson':
+            content = write_ndjson(names, chunks)
+        else:
+            if find_spec('pyarrow') is None:
+                raise ValidationError({'output': ['Parquet export needs pyarrow to be installed.']})
+            fields = [queryset.query.resolve_ref(lookup).target for lookup in lookups]
+            content = write_parquet(names, fields, chunks)
+        response = StreamingHttpResponse(content, content_type=self.export_outputs[output])
+        response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (self.basename, output)
+        return response
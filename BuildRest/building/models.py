@@ -1,8 +1,9 @@
+import time
 from django.contrib.auth.base_user import AbstractBaseUser
 from django.contrib.auth.models import PermissionsMixin
 from django.contrib.postgres.fields import ArrayField
 from django.db import models
-from rest_framework_simplejwt.tokens import RefreshToken
+from .blacklist import RefreshToken
 from .managers import CustomUserManager
 
 
@@ -16,6 +17,8 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     is_superuser = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     date_joined = models.DateTimeField(auto_now_add=True)
+    # tokens authenticated before this are refused, see authentication.py
+    tokens_valid_after = models.DateTimeField(null=True, blank=True)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
@@ -30,7 +33,11 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         return self._generate_jwt_token()
 
     def _generate_jwt_token(self):
+        # the claims StatelessJWTAuthentication trusts, copied into every access token of the refresh token
         refresh = RefreshToken.for_user(self)
+        refresh['is_superuser'] = self.is_superuser
+        refresh['is_staff'] = self.is_staff
+        refresh['auth_time'] = time.time()
         return refresh
 
 
@@ -48,6 +55,30 @@ class Construction(models.Model):
     floor_number = models.IntegerField(default=1)
     build_date = models.DateField()
     total_area = models.DecimalField(max_digits=100, decimal_places=2, default=0)
+    latest_evaluation = models.OneToOneField('Evaluation', on_delete=models.SET_NULL, null=True, blank=True,
+                                             related_name='+')
+    construction_reliability = models.DecimalField(max_digits=100, decimal_places=3, null=True, blank=True)
+    construction_damage = models.DecimalField(max_digits=100, decimal_places=3, null=True, blank=True)
+    final_coefficient = models.DecimalField(max_digits=100, decimal_places=3, null=True, blank=True)
+    years_until_full_warning = models.DecimalField(max_digits=100, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'build_date'], name='construction_owner_build_idx'),
+            models.Index(fields=['owner', 'height'], name='construction_owner_height_idx'),
+            models.Index(fields=['build_date'], name='construction_build_date_idx'),
+            models.Index(fields=['height'], name='construction_height_idx'),
+            # the at-risk rankings, see ConstructionViewSet.at_risk
+            models.Index(fields=['owner', '-construction_damage', 'id'], name='construction_owner_damage_idx',
+                         condition=models.Q(construction_damage__isnull=False)),
+            models.Index(fields=['-construction_damage', 'id'], name='construction_damage_idx',
+                         condition=models.Q(construction_damage__isnull=False)),
+            models.Index(fields=['owner', 'years_until_full_warning', 'id'], name='construction_owner_warning_idx',
+                         condition=models.Q(years_until_full_warning__isnull=False)),
+            models.Index(fields=['years_until_full_warning', 'id'], name='construction_warning_idx',
+                         condition=models.Q(years_until_full_warning__isnull=False)),
+        ]
 
     def __str__(self):
         return "{}, {}, {}, {}, {}, {}, {}".format(self.name,
@@ -162,12 +193,20 @@ class Floor(models.Model):
 
 
 class Measurement(models.Model):
-    construction = models.ForeignKey(Construction, on_delete=models.CASCADE)
+    # measurement_construction_idx on (construction, date) serves the key
+    construction = models.ForeignKey(Construction, on_delete=models.CASCADE, db_index=False)
     date = models.DateField(auto_now_add=True)
     temperature = models.DecimalField(max_digits=100, decimal_places=3, blank=True)
     humidity = models.DecimalField(max_digits=5, decimal_places=2, blank=True)
     acoustic_analysis = models.DecimalField(max_digits=5, decimal_places=2, blank=True, default=0)
     vibration = models.DecimalField(max_digits=100, decimal_places=3, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['construction', 'date'], name='measurement_construction_idx'),
+            models.Index(fields=['date', 'id'], name='measurement_date_id_idx'),
+        ]
 
     def __str__(self):
         return "{}, {}, {}, {}".format(self.date,
@@ -176,8 +215,42 @@ class Measurement(models.Model):
                                        self.vibration)
 
 
+class MeasurementRollup(models.Model):
+    BUCKETS = [
+        ('day', 'Day'),
+        ('week', 'Week'),
+        ('month', 'Month'),
+    ]
+    construction = models.ForeignKey(Construction, on_delete=models.CASCADE)
+    bucket = models.CharField(choices=BUCKETS, max_length=5)
+    start = models.DateField()
+    count = models.IntegerField(default=0)
+    temperature_sum = models.DecimalField(max_digits=100, decimal_places=3)
+    temperature_min = models.DecimalField(max_digits=100, decimal_places=3)
+    temperature_max = models.DecimalField(max_digits=100, decimal_places=3)
+    humidity_sum = models.DecimalField(max_digits=100, decimal_places=2)
+    humidity_min = models.DecimalField(max_digits=5, decimal_places=2)
+    humidity_max = models.DecimalField(max_digits=5, decimal_places=2)
+    acoustic_analysis_sum = models.DecimalField(max_digits=100, decimal_places=2)
+    acoustic_analysis_min = models.DecimalField(max_digits=5, decimal_places=2)
+    acoustic_analysis_max = models.DecimalField(max_digits=5, decimal_places=2)
+    vibration_sum = models.DecimalField(max_digits=100, decimal_places=3)
+    vibration_min = models.DecimalField(max_digits=100, decimal_places=3)
+    vibration_max = models.DecimalField(max_digits=100, decimal_places=3)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['construction', 'bucket', 'start'], name='measurement_rollup_unique'),
+        ]
+
+    def __str__(self):
+        return "{}, {}, {}".format(self.bucket,
+                                   self.start,
+                                   self.count)
+
+
 class Evaluation(models.Model):
-    measurement = models.OneToOneField(Measurement, on_delete=models.CASCADE, primary_key=True)
+    measurement = models.OneToOneField(Measurement, on_delete=models.CASCADE, primary_key=True, db_constraint=False)
     foundation_mark = models.DecimalField(max_digits=100, decimal_places=2, blank=True)
     floor_mark = models.DecimalField(max_digits=6, decimal_places=3, blank=True, default=0)
     walls_mark = models.DecimalField(max_digits=6, decimal_places=3, blank=True, default=0)
@@ -191,14 +264,56 @@ class Evaluation(models.Model):
                                self.construction_reliability)
 
 
+class EvaluationTask(models.Model):
+    STATUSES = [
+        ('pending', 'Pending'),
+        ('failed', 'Failed'),
+    ]
+    measurement = models.OneToOneField(Measurement, on_delete=models.CASCADE, primary_key=True, db_constraint=False)
+    status = models.CharField(choices=STATUSES, default='pending', max_length=7)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['measurement'], condition=models.Q(status='pending'),
+                         name='evaluation_task_pending_idx'),
+        ]
+
+    def __str__(self):
+        return "{}, {}".format(self.measurement_id,
+                               self.status)
+
+
 class Prediction(models.Model):
     construction = models.ForeignKey(Construction, on_delete=models.CASCADE)
     date = models.DateField(auto_now_add=True)
     years_until_full_fix = models.DecimalField(max_digits=100, decimal_places=2, blank=True, default=0)
     years_until_full_warning = models.DecimalField(max_digits=100, decimal_places=2, blank=True, default=0)
     construction_damage_predicted = ArrayField(models.DecimalField(max_digits=100, decimal_places=3))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['construction', 'date'], name='prediction_construction_idx'),
+            models.Index(fields=['date', 'id'], name='prediction_date_id_idx'),
+        ]
 
     def __str__(self):
         return "{}, {}".format(self.date,
                                self.years_until_full_fix,
                                self.years_until_full_warning)
+
+
+class ImportCheckpoint(models.Model):
+    source = models.CharField(unique=True, max_length=255)
+    offset = models.BigIntegerField(default=0)
+    rows = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return "{}, {}, {}".format(self.source,
+                                   self.offset,
+                                   self.rows)
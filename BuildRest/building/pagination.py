@@ -0,0 +1,155 @@
+import binascii
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class StandardPagination(PageNumberPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        return super().paginate_queryset(queryset, request, view)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Seeks to the rows after (or before) the cursor position instead of using an offset,
+    so every page costs the same no matter how deep it is.
+    The view may override the sort key with a ``keyset_ordering`` attribute.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 1000
+    ordering = ('date', 'id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = getattr(view, 'keyset_ordering', self.ordering)
+        self.keys = [field if '__' not in field else 'keyset_%d' % i for i, field in enumerate(self.ordering)]
+        position, reverse = self.decode_cursor(request, queryset.model)
+
+        queryset = queryset.annotate(**{key: F(field) for key, field in zip(self.keys, self.ordering)
+                                        if key != field})
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(position, reverse))
+        queryset = queryset.order_by(*[('-' if reverse else '') + key for key in self.keys])
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = results
+        return results
+
+    def get_keyset_filter(self, position, reverse):
+        lookup = 'lt' if reverse else 'gt'
+        # (a, b) > (x, y)  <=>  a >= x AND (a > x OR (a = x AND b > y)); the first term lets the index range scan
+        condition = Q()
+        for i, key in enumerate(self.keys):
+            condition |= Q(**dict(zip(self.keys[:i], position[:i])), **{'%s__%s' % (key, lookup): position[i]})
+        return Q(**{'%s__%se' % (self.keys[0], lookup): position[0]}) & condition
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(request.query_params[self.page_size_query_param],
+                                 strict=True, cutoff=self.max_page_size)
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_position(self, row):
+        return [row[key] if isinstance(row, dict) else getattr(row, key) for key in self.keys]
+
+    def get_key_field(self, model, path):
+        for name in path.split('__'):
+            field = model._meta.get_field(name)
+            model = field.related_model
+        # a key's value is that of the field it points to
+        return field.target_field if field.is_relation else field
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            cursor = json.loads(b64decode(encoded.encode('ascii'), altchars=b'-_'))
+            position, reverse = cursor['p'], bool(cursor.get('r'))
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.keys):
+            raise NotFound(self.invalid_cursor_message)
+        # a mistyped or out of range value would otherwise only fail in the database
+        try:
+            position = [self.clean_key(self.get_key_field(model, field), value)
+                        for field, value in zip(self.ordering, position)]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def clean_key(self, field, value):
+        # without Field.validate(), which would look up related rows that may since have been deleted
+        if value is None:
+            raise ValidationError('Missing key')
+        value = field.to_python(value)
+        field.run_validators(value)
+        return value
+
+    def encode_cursor(self, position, reverse):
+        cursor = {'p': position}
+        if reverse:
+            cursor['r'] = 1
+        encoded = b64encode(json.dumps(cursor, default=str).encode('utf-8'), altchars=b'-_').decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[-1]), False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[0]), True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                },
+                'previous': {
+                    'type': 'string',
+                    'nullable': True,
+                },
+                'results': schema,
+            },
+        }
@@ -0,0 +1,85 @@
+from datetime import date
+from .models import Evaluation, Measurement
+
+# Measurement is range partitioned by year on ``date``: building_measurement_y<year> for every
+# year that has readings plus a few ahead, and building_measurement_default for anything else.
+# Its primary key is (id, date), as a partitioned table can only enforce keys holding the
+# partition column, so Evaluation keeps its one-to-one key to it without a database constraint.
+
+TABLE = Measurement._meta.db_table
+DEFAULT = TABLE + '_default'
+
+
+def partition_name(year):
+    return '%s_y%d' % (TABLE, year)
+
+
+def archive_name(year):
+    return '%s_y%d' % (Evaluation._meta.db_table, year)
+
+
+def get_partitions(cursor):
+    # {year: name} of the attached yearly partitions
+    cursor.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                   "WHERE i.inhparent = %s::regclass", [TABLE])
+    prefix = TABLE + '_y'
+    return {int(name[len(prefix):]): name for name, in cursor.fetchall() if name.startswith(prefix)}
+
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = %s::regclass", [TABLE])
+    return cursor.fetchone()[0]
+
+
+def create_partition(cursor, year):
+    # readings of that year may already sit in the default partition, which would then refuse the
+    # new range; move them into the new table first and attach it with them
+    name = partition_name(year)
+    if year in get_partitions(cursor):
+        return False
+    cursor.execute('CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS)'.format(name, TABLE))
+    cursor.execute('WITH moved AS (DELETE FROM {} WHERE date >= %s AND date < %s RETURNING *) '
+                   'INSERT INTO {} SELECT * FROM moved'.format(DEFAULT, name),
+                   [date(year, 1, 1), date(year + 1, 1, 1)])
+    cursor.execute('ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)'.format(TABLE, name),
+                   [date(year, 1, 1), date(year + 1, 1, 1)])
+    return True
+
+
+def create_partitions(cursor, ahead=2, source=DEFAULT):
+    # a partition for every year with readings in ``source``, and up to ``ahead`` years from now
+    cursor.execute('SELECT DISTINCT extract(year FROM date)::integer FROM {}'.format(source))
+    years = {year for year, in cursor.fetchall()} | set(range(date.today().year, date.today().year + ahead + 1))
+    return [year for year in sorted(years) if create_partition(cursor, year)]
+
+
+def archive_partition(cursor, year, drop=False):
+    """
+    Detaches the partition of ``year``. Its evaluations are moved to building_evaluation_y<year>,
+    both tables are kept as plain tables unless ``drop`` is set, and constructions whose latest
+    evaluation went with them fall back to their latest remaining one. The rollups are kept.
+    """
+    from .ingest import update_latest_evaluations
+
+    name = partition_name(year)
+    evaluation_table = Evaluation._meta.db_table
+    # the constraints of the referenced tables cannot be altered with deferred checks pending
+    cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    cursor.execute('ALTER TABLE {} DETACH PARTITION {}'.format(TABLE, name))
+    # an archived reading must not keep its construction from being deleted
+    cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'", [name])
+    for constraint, in cursor.fetchall():
+        cursor.execute('ALTER TABLE {} DROP CONSTRAINT {}'.format(name, constraint))
+    cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+
+    cursor.execute('SELECT DISTINCT construction_id FROM {}'.format(name))
+    construction_ids = [construction_id for construction_id, in cursor.fetchall()]
+    if not drop:
+        cursor.execute('CREATE TABLE {} AS SELECT e.* FROM {} e JOIN {} m ON m.id = e.measurement_id'.format(
+            archive_name(year), evaluation_table, name))
+    cursor.execute('DELETE FROM {} e USING {} m WHERE m.id = e.measurement_id'.format(evaluation_table, name))
+    update_latest_evaluations(construction_ids)
+    if drop:
+        cursor.execute('DROP TABLE {}'.format(name))
+    return len(construction_ids)
+
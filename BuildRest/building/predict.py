@@ -1,6 +1,8 @@
 from datetime import date
 from dateutil import relativedelta as rdelta
 from math import log, e, pow
+import numpy as np
+from .evaluate import ages_in_years, as_floats, round_half_even
 
 
 def years_until_damage(wear):
@@ -19,14 +21,14 @@ def damage_calc(predicted_age, wear):
     return round(1 - pow(e, -(wear * predicted_age)), 3)
 
 
-def prediction(id, reliability, date_build):
+def prediction(id, reliability, date_build, horizons=10, step=5):
     age = rdelta.relativedelta(date.today(), date_build).years
     wear = wear_calc(reliability, age)
     predicted_values = []
-    years_ahead = 5
-    for i in range(10):
+    years_ahead = step
+    for i in range(horizons):
         predicted_values.append(round(damage_calc(years_ahead, wear), 3))
-        years_ahead += 5
+        years_ahead += step
 
     result = {
         "years_until_full_fix": round(years_until_damage(wear), 1),
@@ -36,3 +38,22 @@ def prediction(id, reliability, date_build):
     }
 
     return result
+
+
+def prediction_batch(ids, reliabilities, dates_build, horizons=10, step=5, date_current=None):
+    # Rows prediction() would reject (reliability of 0 or 1, built this year) are left out.
+    age = ages_in_years(dates_build, date_current)
+    reliability = as_floats(reliabilities)
+    valid = (reliability > 0) & (reliability != 1) & (age != 0)
+    wear = -(np.log(reliability[valid]) / age[valid])
+    years_ahead = step * np.arange(1, horizons + 1)
+    damage = round_half_even(1 - np.power(e, -(wear[:, np.newaxis] * years_ahead)), 3)
+
+    result = {
+        "years_until_full_fix": round_half_even(years_until_damage(wear), 1),
+        "years_until_full_warning": round_half_even(years_until_warning(wear), 1),
+        "construction_damage_predicted": damage.reshape(-1, horizons),
+        "construction": np.asarray(ids)[valid]
+    }
+
+    return result
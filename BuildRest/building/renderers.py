@@ -1,8 +1,33 @@
-import json
 from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-class UserJSONRenderer(JSONRenderer):
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Encodes with orjson when it is installed, with the same output as DRF's compact JSONRenderer.
+    Indented output and anything orjson cannot encode go through the stdlib encoder.
+    """
+    options = 0 if orjson is None else orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=encoders.JSONEncoder().default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # like DRF, escape the separators that are valid JSON but not valid JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class UserJSONRenderer(FastJSONRenderer):
     charset = 'utf-8'
 
     def render(self, data, media_type=None, renderer_context=None):
@@ -11,4 +36,4 @@ class UserJSONRenderer(JSONRenderer):
         if token is not None and isinstance(token, bytes):
             data['tokens']['access'] = token.decode('utf-8')
 
-        return json.dumps(data)
+        return super().render(data, media_type, renderer_context)
@@ -0,0 +1,66 @@
+from django.db import connections
+from django.db.models import F
+from .models import Construction, Floor, Foundation, Roof, Walls
+
+# Portfolio risk figures over the latest evaluation of each construction, which Construction
+# keeps a copy of (see ingest.update_latest_evaluations), so that no evaluation is read.
+
+METRICS = ['construction_reliability', 'construction_damage', 'final_coefficient']
+PERCENTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+# (name, lookup, choices)
+GROUPS = [
+    ('construction_type', 'construction_type', Construction.CONSTRUCTION_TYPES),
+    ('roof_material', 'roof__roof_material', Roof.ROOF_MATERIALS),
+    ('walls_material', 'walls__walls_material', Walls.WALLS_MATERIALS),
+    ('floor_type', 'floor__floor_type', Floor.FLOOR_TYPES),
+    ('foundation_material', 'foundation__foundation_material', Foundation.FOUNDATION_MATERIALS),
+]
+
+
+def summary_sql(queryset):
+    # one GROUP BY GROUPING SETS over the constructions of ``queryset``: the whole set, then each group
+    queryset = queryset.order_by().values(
+        *[lookup for name, lookup, choices in GROUPS if name == lookup] + METRICS,
+        **{name: F(lookup) for name, lookup, choices in GROUPS if name != lookup})
+    query, params = queryset.query.sql_with_params()
+    columns = ', '.join('t.%s' % name for name, lookup, choices in GROUPS)
+    aggregates = ', '.join(
+        'min(t.{0})::float8, max(t.{0})::float8, avg(t.{0})::float8, '
+        'percentile_cont(%s::float8[]) WITHIN GROUP (ORDER BY t.{0})'.format(metric) for metric in METRICS)
+    sets = ', '.join('(t.%s)' % name for name, lookup, choices in GROUPS)
+    sql = ('SELECT GROUPING({columns}), {columns}, count(*), count(t.{evaluated}), {aggregates} '
+           'FROM ({query}) t GROUP BY GROUPING SETS ((), {sets})').format(
+        columns=columns, evaluated=METRICS[0], aggregates=aggregates, query=query, sets=sets)
+    return sql, [PERCENTILES] * len(METRICS) + list(params)
+
+
+def summarize(values):
+    count, evaluated = values[:2]
+    summary = {'count': count, 'evaluated': evaluated}
+    for i, metric in enumerate(METRICS):
+        low, high, mean, percentiles = values[2 + 4 * i:6 + 4 * i]
+        summary[metric] = dict(
+            {'min': low, 'max': high, 'mean': round(mean, 3) if mean is not None else None},
+            **{'p%d' % (percentile * 100): round(value, 3) if value is not None else None
+               for percentile, value in zip(PERCENTILES, percentiles or [None] * len(PERCENTILES))})
+    return summary
+
+
+def risk_summary(queryset):
+    sql, params = summary_sql(queryset)
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    everything = (1 << len(GROUPS)) - 1
+    result = {}
+    for i, (name, lookup, choices) in enumerate(GROUPS):
+        # GROUPING() has a bit per column, the first one highest, set when it is not grouped by
+        grouping = everything & ~(1 << (len(GROUPS) - 1 - i))
+        labels = dict(choices)
+        result[name] = sorted([
+            dict({'value': row[1 + i], 'label': labels.get(row[1 + i])}, **summarize(row[1 + len(GROUPS):]))
+            for row in rows if row[0] == grouping], key=lambda group: (group['value'] is None, group['value'] or ''))
+    for row in rows:
+        if row[0] == everything:
+            result['total'] = summarize(row[1 + len(GROUPS):])
+    return result
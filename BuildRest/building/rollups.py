@@ -0,0 +1,79 @@
+from datetime import timedelta
+from django.db import connections, router
+from .models import Measurement, MeasurementRollup
+
+# MeasurementRollup keeps count, sum, min and max of every metric per construction and
+# day, week (starting on Monday) and month, so that the mean is sum / count and new
+# readings can be folded into existing rows without reading the ones already counted.
+
+METRICS = ['temperature', 'humidity', 'acoustic_analysis', 'vibration']
+BUCKETS = [bucket for bucket, name in MeasurementRollup.BUCKETS]
+
+# the rollup rows holding some (construction_id, date) readings
+READING_KEYS = (
+    'SELECT DISTINCT r.construction_id, b.bucket, date_trunc(b.bucket, r.date::timestamp)::date AS start, '
+    "(date_trunc(b.bucket, r.date::timestamp) + ('1 ' || b.bucket)::interval)::date AS stop "
+    'FROM unnest(%s::bigint[], %s::date[]) r(construction_id, date) CROSS JOIN unnest(%s::varchar[]) b(bucket)'
+)
+
+
+def bucket_start(bucket, day):
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def rollup_sql(where):
+    # groups the measurements matching ``where``, which may use ``m`` and ``b.bucket``, into rollup rows
+    return (
+        'INSERT INTO {rollup} AS r (construction_id, bucket, start, count, {columns}) '
+        'SELECT m.construction_id, b.bucket, date_trunc(b.bucket, m.date::timestamp)::date, count(*), {aggregates} '
+        'FROM {measurement} m CROSS JOIN unnest(%s::varchar[]) b(bucket) '
+        'WHERE {where} GROUP BY 1, 2, 3'
+    ).format(rollup=MeasurementRollup._meta.db_table, measurement=Measurement._meta.db_table, where=where,
+             columns=', '.join('{0}_sum, {0}_min, {0}_max'.format(metric) for metric in METRICS),
+             aggregates=', '.join('sum(m.{0}), min(m.{0}), max(m.{0})'.format(metric) for metric in METRICS))
+
+
+def execute(sql, params):
+    connection = connections[router.db_for_write(MeasurementRollup)]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def add_rollups(measurement_ids):
+    # folds newly inserted measurements into the rollups
+    measurement_ids = list(measurement_ids)
+    if not measurement_ids:
+        return 0
+    merge = ', '.join(
+        '{0}_sum = r.{0}_sum + excluded.{0}_sum, {0}_min = least(r.{0}_min, excluded.{0}_min), '
+        '{0}_max = greatest(r.{0}_max, excluded.{0}_max)'.format(metric) for metric in METRICS)
+    return execute(rollup_sql('m.id = any(%s)') + ' ON CONFLICT (construction_id, bucket, start) '
+                   'DO UPDATE SET count = r.count + excluded.count, ' + merge, [BUCKETS, measurement_ids])
+
+
+def refresh_rollups(readings):
+    # recomputes the rollups holding the (construction_id, date) readings, for changes that
+    # cannot be folded in: updated or deleted measurements
+    readings = set(readings)
+    if not readings:
+        return 0
+    params = [[construction_id for construction_id, date in readings], [date for construction_id, date in readings],
+              BUCKETS]
+    execute('DELETE FROM {} t USING ({}) k WHERE t.construction_id = k.construction_id AND t.bucket = k.bucket '
+            'AND t.start = k.start'.format(MeasurementRollup._meta.db_table, READING_KEYS), params)
+    return execute(rollup_sql(
+        'm.construction_id = any(%s) AND EXISTS (SELECT FROM ({}) k WHERE k.construction_id = m.construction_id '
+        'AND k.bucket = b.bucket AND m.date >= k.start AND m.date < k.stop)'.format(READING_KEYS)),
+        [BUCKETS, params[0]] + params)
+
+
+def rebuild_rollups(construction_ids):
+    construction_ids = list(construction_ids)
+    execute('DELETE FROM {} WHERE construction_id = any(%s)'.format(MeasurementRollup._meta.db_table),
+            [construction_ids])
+    return execute(rollup_sql('m.construction_id = any(%s)'), [BUCKETS, construction_ids])
@@ -1,6 +1,15 @@
+import copy
+from datetime import datetime, timedelta
+from django.conf import settings
 from django.contrib.auth import authenticate
-from rest_framework import serializers
+from django.utils import timezone
+from django.utils.encoding import force_str
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as JWTTokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .blacklist import RefreshToken
 from .models import *
 
 
@@ -22,6 +31,16 @@ class RegistrationSerializer(serializers.ModelSerializer):
         return CustomUser.objects.create_user(**validated_data)
 
 
+class BulkUserSerializer(serializers.ModelSerializer):
+    password = serializers.CharField(max_length=128, min_length=8, write_only=True)
+
+    class Meta:
+        model = CustomUser
+        fields = ['first_name', 'last_name', 'phone', 'email', 'password']
+        # checked for all the rows at once by users.provision_users
+        extra_kwargs = {'email': {'validators': []}, 'phone': {'validators': []}}
+
+
 class LoginSerializer(serializers.ModelSerializer):
     email = serializers.CharField(max_length=255)
     password = serializers.CharField(max_length=128, write_only=True)
@@ -67,7 +86,7 @@ class LoginSerializer(serializers.ModelSerializer):
 
 
 class LogoutSerializer(serializers.ModelSerializer):
-    refresh = serializers.CharField(max_length=255, read_only=True)
+    refresh = serializers.CharField(write_only=True)
 
     class Meta:
         model = CustomUser
@@ -84,6 +103,20 @@ class LogoutSerializer(serializers.ModelSerializer):
             self.fail('Bad token')
 
 
+class TokenRefreshSerializer(JWTTokenRefreshSerializer):
+    # simplejwt's, with the blacklist checked through blacklist_filter
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs['refresh'])
+        data = {'access': str(refresh.access_token)}
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            if jwt_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            data['refresh'] = str(refresh)
+        return data
+
+
 class CustomUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
@@ -94,6 +127,8 @@ class CreateConstructionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Construction
         fields = '__all__'
+        read_only_fields = ['latest_evaluation', 'construction_reliability', 'construction_damage',
+                            'final_coefficient', 'years_until_full_warning']
 
 
 class FoundationSerializer(serializers.ModelSerializer):
@@ -181,6 +216,14 @@ class CreateMeasurementSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class BulkMeasurementSerializer(serializers.ModelSerializer):
+    construction = serializers.IntegerField(source='construction_id')
+
+    class Meta:
+        model = Measurement
+        fields = '__all__'
+
+
 class EvaluationSerializer(serializers.ModelSerializer):
     measurement = MeasurementSerializer
 
@@ -203,7 +246,136 @@ class PredictionSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class PredictionRequestSerializer(serializers.Serializer):
+    construction = serializers.IntegerField()
+
+
+class BatchPredictionSerializer(serializers.Serializer):
+    constructions = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=100000)
+    horizons = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    step = serializers.IntegerField(min_value=1, max_value=100, default=5)
+
+
+class AtRiskQuerySerializer(serializers.Serializer):
+    k = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+    by = serializers.ChoiceField(choices=['damage', 'warning'], default='damage')
+
+
+class TimeseriesQuerySerializer(serializers.Serializer):
+    bucket = serializers.ChoiceField(choices=MeasurementRollup.BUCKETS, default='week')
+    min_measurement_date = serializers.DateField(required=False)
+    max_measurement_date = serializers.DateField(required=False)
+
+
+class MeasurementRollupSerializer(serializers.ModelSerializer):
+    temperature_mean = serializers.DecimalField(max_digits=None, decimal_places=3, read_only=True)
+    humidity_mean = serializers.DecimalField(max_digits=None, decimal_places=2, read_only=True)
+    acoustic_analysis_mean = serializers.DecimalField(max_digits=None, decimal_places=2, read_only=True)
+    vibration_mean = serializers.DecimalField(max_digits=None, decimal_places=3, read_only=True)
+
+    class Meta:
+        model = MeasurementRollup
+        fields = ['start', 'count',
+                  'temperature_min', 'temperature_max', 'temperature_mean',
+                  'humidity_min', 'humidity_max', 'humidity_mean',
+                  'acoustic_analysis_min', 'acoustic_analysis_max', 'acoustic_analysis_mean',
+                  'vibration_min', 'vibration_max', 'vibration_mean']
+
+
 class CreatePredictionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Prediction
         fields = '__all__'
+
+
+class FastSerializer:
+    """
+    Read-only list serializer compiled from a ModelSerializer class. It renders ``values()``
+    rows that contain ``paths`` and gives the same output as the original serializer.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self.paths = []
+        # datetimes only skip the timezone conversion while the current timezone is UTC
+        self.build_utc = self.compile(serializer_class(), '', True)
+        self.paths = []
+        self.build = self.compile(serializer_class(), '', False)
+
+    def bind(self, rows):
+        bound = copy.copy(self)
+        bound.instance = rows
+        if settings.USE_TZ and timezone.get_current_timezone_name() == 'UTC':
+            bound.build = self.build_utc
+        return bound
+
+    @property
+    def data(self):
+        return [self.build(row) for row in self.instance]
+
+    def compile(self, serializer, prefix, utc):
+        model = serializer.Meta.model
+        pk_path = prefix + model._meta.pk.name
+        self.paths.append(pk_path)
+        getters = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or isinstance(field, (serializers.ListSerializer, serializers.SerializerMethodField,
+                                                         serializers.HyperlinkedRelatedField)):
+                raise TypeError('{}.{} cannot be compiled to a fast serializer'.format(
+                    type(serializer).__name__, name))
+            path = prefix + '__'.join(field.source_attrs)
+            if isinstance(field, serializers.BaseSerializer):
+                getters.append((name, self.compile(field, path + '__', utc)))
+                continue
+            convert = self.get_converter(model, field, utc)
+            if field.source.startswith('get_') and field.source.endswith('_display'):
+                path = prefix + field.source[4:-8]
+            self.paths.append(path)
+            getters.append((name, self.get_value(path, convert)))
+
+        def build(row):
+            if row[pk_path] is None:
+                return None
+            return {name: getter(row) for name, getter in getters}
+        return build
+
+    def get_value(self, path, convert):
+        def get(row):
+            value = row[path]
+            return None if value is None else convert(value)
+        return get
+
+    def get_converter(self, model, field, utc):
+        if field.source.startswith('get_') and field.source.endswith('_display'):
+            choices = {key: force_str(label, strings_only=True)
+                       for key, label in model._meta.get_field(field.source[4:-8]).flatchoices}
+            return lambda value: str(choices.get(value, value))
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+            return lambda value: value
+        if type(field) in (serializers.CharField, serializers.EmailField):
+            return str
+        if type(field) is serializers.IntegerField:
+            return int
+        if type(field) is serializers.DateField and getattr(field, 'format', api_settings.DATE_FORMAT) == ISO_8601:
+            return lambda value: value if isinstance(value, str) else value.isoformat()
+        if (utc and type(field) is serializers.DateTimeField and not hasattr(field, 'timezone')
+                and getattr(field, 'format', api_settings.DATETIME_FORMAT) == ISO_8601):
+            def convert(value):
+                # the database returns UTC datetimes, which need no conversion
+                if isinstance(value, datetime) and value.utcoffset() == timedelta(0):
+                    return value.isoformat()[:-6] + 'Z'
+                return field.to_representation(value)
+            return convert
+        if (type(field) is serializers.DecimalField and not field.localize
+                and getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)):
+            exponent = -field.decimal_places
+
+            def convert(value):
+                # values read from the database already have the column's scale
+                if value.as_tuple().exponent == exponent:
+                    return '{:f}'.format(value)
+                return field.to_representation(value)
+            return convert
+        return field.to_representation
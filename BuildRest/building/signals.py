@@ -1,12 +1,24 @@
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Now
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
+from .authentication import forget_revocation
+from .cache import invalidate_constructions
 from .evaluate import evaluate
-from .models import Measurement, Construction, Evaluation
+from .ingest import enqueue_evaluations, update_latest_evaluations
+from .models import CustomUser, Measurement, Construction, Evaluation, Roof, Walls, Floor, Foundation
+from .rollups import add_rollups
 
 
 @receiver(post_save, sender=Measurement)
 def measurement_post_post_save(sender, instance, created, **kwargs):
     if created:
+        add_rollups([instance.id])
+        if settings.EVALUATION_MODE == 'queue':
+            enqueue_evaluations([instance.id])
+            return
         building = Construction.objects.select_related('roof', 'walls', 'floor', 'foundation').get(id=instance.construction_id)
         result = (evaluate(instance.id, building.build_date,
                            [building.roof.roof_material, building.walls.walls_material, building.floor.floor_type,
@@ -23,3 +35,69 @@ def measurement_post_post_save(sender, instance, created, **kwargs):
             measurement=instance,
         )
         evaluation.save()
+        update_latest_evaluations([instance.construction_id])
+
+
+@receiver(pre_save, sender=Construction)
+def construction_pre_save(sender, instance, raw, **kwargs):
+    instance._previous_owner_id = None
+    if instance.pk is not None and not raw:
+        instance._previous_owner_id = Construction.objects.filter(pk=instance.pk).values_list(
+            'owner_id', flat=True).first()
+
+
+@receiver(post_save, sender=Construction)
+@receiver(post_delete, sender=Construction)
+def construction_changed(sender, instance, **kwargs):
+    invalidate_constructions([(instance.pk, instance.owner_id),
+                              (instance.pk, getattr(instance, '_previous_owner_id', None))])
+
+
+@receiver(post_save, sender=Roof)
+@receiver(post_save, sender=Walls)
+@receiver(post_save, sender=Floor)
+@receiver(post_save, sender=Foundation)
+@receiver(post_delete, sender=Roof)
+@receiver(post_delete, sender=Walls)
+@receiver(post_delete, sender=Floor)
+@receiver(post_delete, sender=Foundation)
+def construction_part_changed(sender, instance, **kwargs):
+    # the construction representation nests its parts
+    constructions = Construction.objects.filter(pk=instance.construction_id)
+    constructions.update(updated_at=Now())
+    owner_id = constructions.values_list('owner_id', flat=True).first()
+    invalidate_constructions([(instance.construction_id, owner_id)])
+
+
+# what the claims of a token, or being able to authenticate at all, depend on
+TOKEN_FIELDS = ('is_active', 'is_superuser', 'is_staff', 'password')
+
+
+# what constructions show of their owner, see ConstructionSerializer
+OWNER_FIELDS = ('first_name', 'last_name', 'phone', 'email')
+
+
+@receiver(pre_save, sender=CustomUser)
+def user_pre_save(sender, instance, raw, **kwargs):
+    instance._revoke_tokens = instance._owner_changed = False
+    if instance.pk is not None and not raw:
+        previous = CustomUser.objects.filter(pk=instance.pk).values_list(*TOKEN_FIELDS, *OWNER_FIELDS).first()
+        if previous is not None:
+            current = tuple(getattr(instance, field) for field in TOKEN_FIELDS + OWNER_FIELDS)
+            instance._revoke_tokens = previous[:len(TOKEN_FIELDS)] != current[:len(TOKEN_FIELDS)]
+            instance._owner_changed = previous[len(TOKEN_FIELDS):] != current[len(TOKEN_FIELDS):]
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def user_changed(sender, instance, **kwargs):
+    user_id = instance.pk
+    if getattr(instance, '_revoke_tokens', False):
+        instance.tokens_valid_after = timezone.now()
+        CustomUser.objects.filter(pk=user_id).update(tokens_valid_after=instance.tokens_valid_after)
+    if getattr(instance, '_owner_changed', False):
+        # the construction representation nests its owner
+        constructions = Construction.objects.filter(owner_id=user_id)
+        constructions.update(updated_at=Now())
+        invalidate_constructions(constructions.values_list('id', 'owner_id'))
+    transaction.on_commit(lambda: forget_revocation(user_id))
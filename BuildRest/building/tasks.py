@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from .ingest import evaluate_measurements, load_construction_parts
+from .models import Evaluation, EvaluationTask, Measurement
+
+# Measurements waiting to be evaluated are rows of EvaluationTask, see ingest.enqueue_evaluations.
+# Workers claim batches of them with SELECT ... FOR UPDATE SKIP LOCKED, so several can run without
+# handing out the same task twice, and delete them once evaluated. A task that keeps failing is
+# kept with status 'failed' and its error.
+
+
+def run_evaluation_batch(batch_size=500):
+    with transaction.atomic():
+        tasks = list(EvaluationTask.objects.select_for_update(skip_locked=True).filter(
+            status='pending').order_by('measurement_id').values_list('measurement_id', flat=True)[:batch_size])
+        if not tasks:
+            return 0
+        evaluated = set(Evaluation.objects.filter(measurement_id__in=tasks).values_list('measurement_id', flat=True))
+        measurements = list(Measurement.objects.filter(id__in=tasks).exclude(id__in=evaluated))
+        parts = load_construction_parts(measurement.construction_id for measurement in measurements)
+        incomplete = [measurement.id for measurement in measurements
+                      if None in parts.get(measurement.construction_id, (None,))]
+        failed = {}
+        try:
+            with transaction.atomic():
+                evaluate_measurements(measurements, parts)
+        except Exception:
+            # one at a time, so that only the measurements that fail on their own are retried
+            for measurement in measurements:
+                try:
+                    with transaction.atomic():
+                        evaluate_measurements([measurement], parts)
+                except Exception as exc:
+                    failed[measurement.id] = repr(exc)
+        for measurement_id, error in failed.items():
+            EvaluationTask.objects.filter(measurement_id=measurement_id).update(
+                attempts=F('attempts') + 1, error=error)
+        EvaluationTask.objects.filter(measurement_id__in=failed,
+                                      attempts__gte=settings.EVALUATION_MAX_ATTEMPTS).update(status='failed')
+        # missing parts will not appear by retrying
+        EvaluationTask.objects.filter(measurement_id__in=incomplete).update(
+            status='failed', attempts=F('attempts') + 1,
+            error='Construction must have roof, walls, floor and foundation to be evaluated.')
+        EvaluationTask.objects.filter(measurement_id__in=tasks).exclude(measurement_id__in=incomplete).exclude(
+            measurement_id__in=failed).delete()
+    return len(tasks)
+
+
+def evaluation_status(measurement_id):
+    if Evaluation.objects.filter(measurement_id=measurement_id).exists():
+        return {'status': 'evaluated', 'attempts': None, 'error': ''}
+    task = EvaluationTask.objects.filter(measurement_id=measurement_id).values('status', 'attempts', 'error').first()
+    return task or {'status': 'not_queued', 'attempts': None, 'error': ''}
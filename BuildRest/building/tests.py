@@ -1,3 +1,1149 @@
-from django.test import TestCase
+import csv
+import json
+import tempfile
+import time
+import numpy as np
+from asgiref.sync import sync_to_async
+from base64 import b64encode
+from io import BytesIO, StringIO
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from django.contrib.auth.hashers import check_password
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import override_settings
+from unittest import mock, skipIf
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from . import tasks
+from .blacklist import BloomFilter, blacklist_filter
+from .management.commands import import_measurements
+from .db.base import DatabaseWrapper, connect
+from .db.pool import ConnectionPool, PoolTimeout
+from .models import *
+from .parsers import FastJSONParser
+from .partitions import DEFAULT, archive_name, get_partitions, partition_name
+from .ingest import predict_constructions, update_latest_evaluations, update_latest_predictions
+from .predict import prediction
+from .rollups import refresh_rollups
+from .tasks import run_evaluation_batch
+from .users import hash_passwords
+from .renderers import FastJSONRenderer
+from .views import MeasurementViewSet
 
-# Create your tests here.
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class QueryCountTests(APITestCase):
+    sizes = (1, 100, 1000)
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='user12345678', phone='1')
+        self.other = CustomUser.objects.create_user(email='other@example.com', password='user12345678', phone='2')
+        Construction.objects.create(owner=self.other, name='other', address='other', height=1,
+                                    build_date=date(2000, 1, 1))
+        self.client.force_authenticate(self.user)
+
+    def create_rows(self, count):
+        Construction.objects.filter(owner=self.user).delete()
+        constructions = Construction.objects.bulk_create([
+            Construction(owner=self.user, name='name %d' % i, address='address %d' % i, height=10,
+                         build_date=date(1990, 1, 1)) for i in range(count)])
+        Roof.objects.bulk_create([Roof(construction=construction) for construction in constructions])
+        Walls.objects.bulk_create([Walls(construction=construction, thickness=1) for construction in constructions])
+        Floor.objects.bulk_create([Floor(construction=construction) for construction in constructions])
+        Foundation.objects.bulk_create([Foundation(construction=construction) for construction in constructions])
+        measurements = Measurement.objects.bulk_create([
+            Measurement(construction=construction, temperature=20, humidity=0.5, vibration=0.5)
+            for construction in constructions])
+        Evaluation.objects.bulk_create([
+            Evaluation(measurement=measurement, foundation_mark=0.1) for measurement in measurements])
+        predictions = Prediction.objects.bulk_create([
+            Prediction(construction=construction, construction_damage_predicted=[0.1, 0.2])
+            for construction in constructions])
+        return constructions[0].id, measurements[0].id, predictions[0].id
+
+    def assertQueries(self, url, count, rows=None):
+        with self.assertNumQueries(count):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        if rows is not None:
+            self.assertEqual(len(response.data['results']), rows)
+        return response
+
+    def test_list_query_count(self):
+        for size in self.sizes:
+            with self.subTest(size=size):
+                self.create_rows(size)
+                for url in ('/api/constructions/', '/api/roofs/', '/api/walls/', '/api/floors/',
+                            '/api/foundations/'):
+                    self.assertQueries(url, 2, min(size, 100))
+                    self.assertQueries(url + '?page_size=1000', 2, size)
+                for url in ('/api/measurements/', '/api/evaluations/', '/api/predictions/'):
+                    response = self.assertQueries(url, 1, min(size, 100))
+                    if response.data['next']:
+                        self.assertQueries(response.data['next'], 1, min(size - 100, 100))
+                    self.assertQueries(url + '?page_size=1000', 1, size)
+                self.assertQueries('/api/users/', 2, 1)
+
+    def test_retrieve_query_count(self):
+        for size in self.sizes:
+            with self.subTest(size=size):
+                construction_id, measurement_id, prediction_id = self.create_rows(size)
+                for url in ('/api/constructions/%d/', '/api/roofs/%d/', '/api/walls/%d/', '/api/floors/%d/',
+                            '/api/foundations/%d/'):
+                    self.assertQueries(url % construction_id, 1)
+                self.assertQueries('/api/measurements/%d/' % measurement_id, 1)
+                self.assertQueries('/api/evaluations/%d/' % measurement_id, 1)
+                self.assertQueries('/api/predictions/%d/' % prediction_id, 1)
+                self.assertQueries('/api/users/me/', 0)
+
+
+class BulkMeasurementTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='user12345678', phone='1')
+        self.construction = Construction.objects.create(owner=self.user, name='name', address='address', height=10,
+                                                        build_date=date(2018, 12, 8))
+        Roof.objects.create(construction=self.construction, roof_material='5')
+        Walls.objects.create(construction=self.construction, walls_material='8', thickness=1)
+        Floor.objects.create(construction=self.construction, floor_type='1')
+        Foundation.objects.create(construction=self.construction, foundation_material='2')
+        other = CustomUser.objects.create_user(email='other@example.com', password='user12345678', phone='2')
+        self.foreign = Construction.objects.create(owner=other, name='name', address='address', height=10,
+                                                   build_date=date(2018, 12, 8))
+        self.client.force_authenticate(self.user)
+
+    def row(self, **values):
+        return dict({'construction': self.construction.id, 'temperature': 34, 'humidity': 0.62,
+                     'acoustic_analysis': 0.17, 'vibration': 0.86}, **values)
+
+    def test_errors_alongside_created_rows(self):
+        rows = [self.row(), self.row(humidity='wet'), self.row(construction=self.foreign.id), self.row(),
+                self.row(construction=0)]
+        response = self.client.post('/api/measurements/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['created']), 2)
+        self.assertEqual([(error['index'], list(error['errors'])) for error in response.data['errors']],
+                         [(1, ['humidity']), (2, ['construction']), (4, ['construction'])])
+        self.assertEqual(Measurement.objects.count(), 2)
+        self.assertEqual(Evaluation.objects.filter(measurement__construction=self.construction).count(), 2)
+
+    def test_all_invalid(self):
+        rows = [self.row(construction=self.foreign.id), self.row(vibration=None)]
+        response = self.client.post('/api/measurements/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['created'], [])
+        self.assertEqual(len(response.data['errors']), 2)
+        self.assertFalse(Measurement.objects.exists())
+        self.assertEqual(self.client.post('/api/measurements/bulk/', self.row(), format='json').status_code, 400)
+
+    def test_ndjson(self):
+        body = '\n'.join(json.dumps(row) for row in (self.row(), self.row(temperature=20))) + '\n'
+        response = self.client.post('/api/measurements/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([row['temperature'] for row in response.data['created']], ['34.000', '20.000'])
+
+    def test_incomplete_construction(self):
+        Roof.objects.filter(construction=self.construction).delete()
+        response = self.client.post('/api/measurements/bulk/', [self.row()], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('roof, walls, floor and foundation', response.data['errors'][0]['errors']['construction'][0])
+
+
+class ImportMeasurementsTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='user12345678', phone='1')
+        self.construction = Construction.objects.create(owner=self.user, name='name', address='address', height=10,
+                                                        build_date=date(2018, 12, 8))
+        Roof.objects.create(construction=self.construction, roof_material='5')
+        Walls.objects.create(construction=self.construction, walls_material='8', thickness=1)
+        Floor.objects.create(construction=self.construction, floor_type='1')
+        Foundation.objects.create(construction=self.construction, foundation_material='2')
+        self.file = tempfile.NamedTemporaryFile('w', suffix='.csv')
+        self.addCleanup(self.file.close)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(['construction', 'date', 'temperature', 'humidity', 'acoustic_analysis', 'vibration'])
+
+    def write(self, rows):
+        for day, temperature in rows:
+            self.writer.writerow([self.construction.id, day, temperature, 0.5, 0.25, 0.125])
+        self.file.flush()
+
+    def run_import(self, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_measurements', self.file.name, chunk_size=2, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_chunks_and_invalid_rows(self):
+        self.write([('2021-01-01', 20), ('2021-01-02', 'warm'), ('2021-01-03', 22)])
+        self.writer.writerow([0, '2021-01-04', 23, 0.5, 0.25, 0.125])
+        self.write([('2021-01-05', 24)])
+        stdout, stderr = self.run_import()
+        self.assertIn('value must be a decimal number', stderr)
+        self.assertIn('Skipped row for construction 0', stderr)
+        self.assertIn('Imported 3 rows', stdout)
+        self.assertEqual(sorted(Measurement.objects.values_list('date', flat=True)),
+                         [date(2021, 1, 1), date(2021, 1, 3), date(2021, 1, 5)])
+        self.assertEqual(Evaluation.objects.count(), 3)
+        self.assertEqual(Construction.objects.get(id=self.construction.id).latest_evaluation.measurement.date,
+                         date(2021, 1, 5))
+
+    def test_resume(self):
+        self.write([('2021-01-0%d' % day, 20 + day) for day in range(1, 6)])
+        evaluate = import_measurements.evaluate_measurements
+        calls = []
+
+        def interrupted(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            return evaluate(*args)
+
+        with mock.patch.object(import_measurements, 'evaluate_measurements', interrupted):
+            with self.assertRaises(KeyboardInterrupt):
+                self.run_import()
+        # the first chunk was kept, the second rolled back
+        self.assertEqual(Measurement.objects.count(), 2)
+
+        stdout, stderr = self.run_import()
+        self.assertIn('Resuming', stdout)
+        self.assertIn('Imported 3 rows', stdout)
+        self.assertEqual(Measurement.objects.count(), 5)
+        self.write([('2021-01-06', 26)])
+        self.assertIn('Imported 1 rows', self.run_import()[0])
+        self.assertEqual(ImportCheckpoint.objects.get().rows, 6)
+
+        self.run_import(restart=True)
+        self.assertEqual(Measurement.objects.count(), 12)
+
+
+class GenerateDataTests(APITestCase):
+    def generate(self):
+        call_command('generate_data', users=[2], constructions=[3], evaluations=[4], fast=True, seed=1,
+                     chunk_size=5, stdout=StringIO())
+        return [
+            list(CustomUser.objects.order_by('id').values_list('email', 'phone', 'first_name', 'last_name')),
+            list(Construction.objects.order_by('id').values_list(
+                'owner__email', 'name', 'address', 'construction_type', 'height', 'build_date', 'roof__roof_material',
+                'walls__walls_material', 'floor__floor_type', 'foundation__foundation_material',
+                'construction_damage', 'years_until_full_warning')),
+            list(Measurement.objects.order_by('id').values_list(
+                'construction__name', 'date', 'temperature', 'humidity', 'acoustic_analysis', 'vibration',
+                'evaluation__final_coefficient')),
+            list(Prediction.objects.order_by('id').values_list('construction__name', 'years_until_full_warning')),
+        ]
+
+    def test_fast_and_seeded(self):
+        first = self.generate()
+        users, constructions, measurements, predictions = first
+        self.assertEqual((len(users), len(constructions), len(measurements)), (2, 3, 12))
+        self.assertEqual(Evaluation.objects.count(), 12)
+        self.assertTrue(all(row[-1] is not None for row in measurements))
+        self.assertTrue(0 < len(predictions) <= 12)
+        self.assertFalse(Construction.objects.filter(latest_evaluation=None).exists())
+        self.assertTrue(MeasurementRollup.objects.exists())
+
+        CustomUser.objects.all().delete()
+        self.assertEqual(self.generate(), first)
+
+
+class KeysetPaginationTests(APITestCase):
+    def test_walks_all_rows_in_date_order(self):
+        user = CustomUser.objects.create_superuser(email='admin@example.com', password='user12345678')
+        construction = Construction.objects.create(owner=user, name='name', address='address', height=1,
+                                                   build_date=date(2000, 1, 1))
+        measurements = Measurement.objects.bulk_create([
+            Measurement(construction=construction, temperature=20, humidity=0.5, vibration=0.5) for i in range(30)])
+        for i, measurement in enumerate(measurements):
+            measurement.date = date(2020, 1, 1 + i % 7)
+        Measurement.objects.bulk_update(measurements, ['date'])
+        expected = [measurement.id for measurement in sorted(measurements, key=lambda m: (m.date, m.id))]
+        self.client.force_authenticate(user)
+
+        seen = []
+        url = '/api/measurements/?page_size=4'
+        while url:
+            response = self.client.get(url)
+            seen += [row['id'] for row in response.data['results']]
+            previous, url = response.data['previous'], response.data['next']
+        self.assertEqual(seen, expected)
+
+        seen = []
+        while previous:
+            response = self.client.get(previous)
+            seen = [row['id'] for row in response.data['results']] + seen
+            previous = response.data['previous']
+        self.assertEqual(seen, expected[:28])
+
+        self.assertEqual(self.client.get('/api/measurements/?cursor=bad').status_code, 404)
+        for position in (['x', 'y'], ['2020-01-01', 'y'], ['2020-01-01', 2 ** 70], [None, 1], [['2020-01-01'], 1]):
+            cursor = b64encode(json.dumps({'p': position}).encode(), altchars=b'-_').decode()
+            for url in ('/api/measurements/', '/api/evaluations/'):
+                self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 404)
+
+
+class LatestEvaluationTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='user12345678', phone='1')
+        self.construction = Construction.objects.create(owner=self.user, name='name', address='address', height=10,
+                                                        build_date=date(2018, 12, 8))
+        Roof.objects.create(construction=self.construction, roof_material='5')
+        Walls.objects.create(construction=self.construction, walls_material='8', thickness=1)
+        Floor.objects.create(construction=self.construction, floor_type='1')
+        Foundation.objects.create(construction=self.construction, foundation_material='2')
+        self.client.force_authenticate(self.user)
+
+    def assertLatest(self, measurement_id):
+        construction = Construction.objects.get(id=self.construction.id)
+        self.assertEqual(construction.latest_evaluation_id, measurement_id)
+        if measurement_id is not None:
+            evaluation = Evaluation.objects.get(measurement_id=measurement_id)
+            self.assertEqual(construction.construction_reliability, evaluation.construction_reliability)
+            self.assertEqual(construction.construction_damage, evaluation.construction_damage)
+            self.assertEqual(construction.final_coefficient, evaluation.final_coefficient)
+
+    def test_pointer_follows_the_latest_measurement(self):
+        row = {'construction': self.construction.id, 'temperature': 34, 'humidity': 0.62, 'acoustic_analysis': 0.17,
+               'vibration': 0.86}
+        first = self.client.post('/api/measurements/', row).data['id']
+        self.assertLatest(first)
+        second = self.client.post('/api/measurements/bulk/', [row], format='json').data['created'][0]['id']
+        self.assertLatest(second)
+
+        with self.assertNumQueries(4):
+            response = self.client.post('/api/predictions/', {'construction': self.construction.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(str(Construction.objects.get(id=self.construction.id).years_until_full_warning),
+                         response.data['years_until_full_warning'])
+
+        Measurement.objects.filter(id=second).update(date=date(2000, 1, 1))
+        call_command('rebuild_latest_evaluations', stdout=StringIO())
+        self.assertLatest(first)
+        self.client.delete('/api/measurements/%d/' % first)
+        self.assertLatest(second)
+        self.client.delete('/api/measurements/%d/' % second)
+        self.assertLatest(None)
+
+    def test_updates_refresh_the_latest_evaluation(self):
+        row = {'construction': self.construction.id, 'temperature': 34, 'humidity': 0.62, 'acoustic_analysis': 0.17,
+               'vibration': 0.86}
+        measurement = self.client.post('/api/measurements/', row).data['id']
+        response = self.client.patch('/api/evaluations/%d/' % measurement, {'construction_damage': '0.999',
+                                                                            'final_coefficient': '0.001'})
+        self.assertEqual(response.status_code, 200)
+        self.assertLatest(measurement)
+        self.assertEqual(Construction.objects.get(id=self.construction.id).construction_damage, Decimal('0.999'))
+
+        other = Construction.objects.create(owner=self.user, name='other', address='address', height=10,
+                                            build_date=date(2018, 12, 8))
+        response = self.client.patch('/api/measurements/%d/' % measurement, {'construction': other.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertLatest(None)
+        self.assertEqual(Construction.objects.get(id=other.id).latest_evaluation_id, measurement)
+
+    def test_prediction_requires_an_evaluation(self):
+        response = self.client.post('/api/predictions/', {'construction': self.construction.id})
+        self.assertEqual(response.status_code, 400)
+        for data in ({'construction': 'abc'}, {}):
+            self.assertEqual(self.client.post('/api/predictions/', data).status_code, 400)
+        other = CustomUser.objects.create_user(email='other@example.com', password='user12345678', phone='2')
+        self.client.force_authenticate(other)
+        response = self.client.post('/api/predictions/', {'construction': self.construction.id})
+        self.assertEqual(response.status_code, 403)
+
+    def test_batch_prediction(self):
+        row = {'construction': self.construction.id, 'temperature': 34, 'humidity': 0.62, 'acoustic_analysis': 0.17,
+               'vibration': 0.86}
+        self.client.post('/api/measurements/', row)
+        unevaluated = Construction.objects.create(owner=self.user, name='new', address='new', height=1,
+                                                  build_date=date(2000, 1, 1))
+        response = self.client.post('/api/predictions/batch/', {
+            'constructions': [self.construction.id, unevaluated.id, 0], 'horizons': 3, 'step': 2}, format='json')
+        self.assertEqual(response.status_code, 201)
+        construction = Construction.objects.get(id=self.construction.id)
+        expected = prediction(construction.id, construction.final_coefficient, construction.build_date, 3, 2)
+        created = response.data['created']
+        self.assertEqual([row['construction'] for row in created], [construction.id])
+        self.assertEqual([float(value) for value in created[0]['construction_damage_predicted']],
+                         expected['construction_damage_predicted'])
+        self.assertEqual([(row['construction'], row['errors']) for row in response.data['errors']],
+                         [(unevaluated.id, ['This construction has not been evaluated yet.']), (0, ['Not found.'])])
+
+        response = self.client.post('/api/predictions/batch/?name=new', {}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Prediction.objects.count(), 1)
+
+    def test_reevaluate_fleet(self):
+        row = {'construction': self.construction.id, 'temperature': 34, 'humidity': 0.62, 'acoustic_analysis': 0.17,
+               'vibration': 0.86}
+        measurement_id = self.client.post('/api/measurements/', row).data['id']
+        call_command('reevaluate_fleet', '--date', '2060-01-01', stdout=StringIO())
+        evaluation = Evaluation.objects.get(measurement_id=measurement_id)
+        construction = Construction.objects.get(id=self.construction.id)
+        self.assertEqual(construction.construction_damage, evaluation.construction_damage)
+        self.assertGreater(evaluation.construction_damage, 0.5)
+        out = StringIO()
+        call_command('reevaluate_fleet', '--date', '2060-01-01', stdout=out)
+        self.assertIn('1 evaluations checked, 0 updated', out.getvalue())
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=60)
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='user12345678', phone='1')
+        self.construction = Construction.objects.create(owner=self.user, name='name', address='address', height=10,
+                                                        build_date=date(2000, 1, 1))
+        self.roof = Roof.objects.create(construction=self.construction, roof_material='2')
+        Walls.objects.create(construction=self.construction, thickness=1)
+        Floor.objects.create(construction=self.construction)
+        Foundation.objects.create(construction=self.construction)
+        self.client.force_authenticate(self.user)
+
+    def test_responses_are_cached_until_the_construction_changes(self):
+        for i, url in enumerate(('/api/constructions/', '/api/constructions/%d/' % self.construction.id)):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    self.client.get(url)
+                    self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+                material = str(3 + i)
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.client.patch('/api/roofs/%d/' % self.roof.pk, {'roof_material': material})
+                    self.client.patch('/api/constructions/%d/' % self.construction.id, {'name': material})
+                response = self.client.get(url)
+                data = response.data['results'][0] if 'results' in response.data else response.data
+                self.assertEqual(data['roof']['roof_material'], dict(Roof.ROOF_MATERIALS)[material])
+                self.assertEqual(data['name'], material)
+
+    def test_responses_are_cached_until_the_owner_changes(self):
+        for url in ('/api/constructions/', '/api/constructions/%d/' % self.construction.id):
+            self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'renamed'
+            self.user.save()
+        for url in ('/api/constructions/', '/api/constructions/%d/' % self.construction.id):
+            response = self.client.get(url)
+            data = response.data['results'][0] if 'results' in response.data else response.data
+            self.assertEqual(data['owner']['first_name'], 'renamed')
+
+    def test_cache_is_per_user(self):
+        self.client.get('/api/constructions/')
+        other = CustomUser.objects.create_user(email='other@example.com', password='user12345678', phone='2')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get('/api/constructions/').data['count'], 0)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='user12345678', phone='1')
+        self.construction = Construction.objects.create(owner=self.user, name='name', address='address', height=10,
+                                                        build_date=date(2000, 1, 1))
+        self.roof = Roof.objects.create(construction=self.construction)
+        Walls.objects.create(construction=self.construction, thickness=1)
+        Floor.objects.create(construction=self.construction)
+        Foundation.objects.create(construction=self.construction)
+        self.measurement = Measurement.objects.create(construction=self.construction, temperature=20, humidity=0.5,
+                                                      vibration=0.5)
+        self.client.force_authenticate(self.user)
+
+    def test_not_modified(self):
+        for url in ('/api/constructions/', '/api/constructions/%d/' % self.construction.id,
+                    '/api/measurements/', '/api/measurements/%d/' % self.measurement.id):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                etag, last_modified = response['ETag'], response['Last-Modified']
+                with self.assertNumQueries(2 if url == '/api/constructions/' else 1):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_etag_changes_with_the_rows(self):
+        url = '/api/constructions/%d/' % self.construction.id
+        etag = self.client.get(url)['ETag']
+        self.client.patch('/api/roofs/%d/' % self.roof.pk, {'roof_material': '3'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = self.client.get(url)['ETag']
+        self.user.last_name = 'renamed'
+        self.user.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['owner']['last_name'], 'renamed')
+
+        etag = self.client.get('/api/measurements/')['ETag']
+        Measurement.objects.create(construction=self.construction, temperature=20, humidity=0.5, vibration=0.5)
+        self.assertEqual(self.client.get('/api/measurements/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class FastListTests(APITestCase):
+    def test_same_output_as_the_serializers(self):
+        user = CustomUser.objects.create_superuser(email='admin@example.com', password='user12345678')
+        self.client.force_authenticate(user)
+        for i, material in enumerate(['1', '5', '8']):
+            construction = Construction.objects.create(owner=user, name='name %d' % i, address='address', height=10,
+                                                       build_date=date(1990 + i, 1, 1), construction_type=str(i + 1))
+            Roof.objects.create(construction=construction, roof_material=material)
+            Walls.objects.create(construction=construction, walls_material=material, thickness=1.5)
+            Floor.objects.create(construction=construction, floor_type=material)
+            Foundation.objects.create(construction=construction, foundation_material=material, area=10)
+            Measurement.objects.create(construction=construction, temperature=20.5, humidity=0.25, vibration=0.125)
+        Construction.objects.create(owner=user, name='no parts', address='address', height=1,
+                                    build_date=date(2000, 1, 1))
+
+        for url in ('/api/constructions/', '/api/measurements/?page_size=2', '/api/evaluations/'):
+            with self.subTest(url=url):
+                with override_settings(FAST_LIST_SERIALIZERS=False):
+                    expected = self.client.get(url)
+                response = self.client.get(url)
+                self.assertEqual(response.content, expected.content)
+                if response.data['next']:
+                    with override_settings(FAST_LIST_SERIALIZERS=False):
+                        expected = self.client.get(response.data['next'])
+                    self.assertEqual(self.client.get(response.data['next']).content, expected.content)
+
+
+class FastJSONTests(APITestCase):
+    def test_renderer_matches_drf(self):
+        data = {
+            'decimal': Decimal('0.125'), 'date': date(2021, 1, 2), 'datetime': datetime(2021, 1, 2, 3, 4, 5, 678901),
+            'aware': datetime(2021, 1, 2, 3, 4, 5, tzinfo=timezone.utc), 'text': 'Ünïcode   "quoted"',
+            'nested': [{'a': [1, 2.5, None, True]}], 1: 'integer key', 'big': 2 ** 70,
+        }
+        for media_type in ('application/json', 'application/json; indent=4'):
+            self.assertEqual(FastJSONRenderer().render(data, media_type), JSONRenderer().render(data, media_type))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_parser_matches_drf(self):
+        for body in (b'{"a": [1, 2.5, "\\u00fc", null], "big": 1234567890123456789}', b'[]'):
+            self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+        for body in (b'{"a": NaN}', b'{"a": '):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(BytesIO(body))
+
+
+@mock.patch.object(MeasurementViewSet, 'export_chunk_size', 2)
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='user12345678', phone='1')
+        other = CustomUser.objects.create_user(email='other@example.com', password='user12345678', phone='2')
+        construction = Construction.objects.create(owner=self.user, name='name', address='address', height=1,
+                                                   build_date=date(2000, 1, 1))
+        elsewhere = Construction.objects.create(owner=other, name='other', address='address', height=1,
+                                                build_date=date(2000, 1, 1))
+        self.measurements = Measurement.objects.bulk_create([
+            Measurement(construction=construction, temperature=20, humidity=0.5, vibration=i) for i in range(5)])
+        Measurement.objects.filter(id=self.measurements[0].id).update(date=date(2020, 1, 1))
+        Measurement.objects.bulk_create([Measurement(construction=elsewhere, temperature=1, humidity=1, vibration=1)])
+        self.client.force_authenticate(self.user)
+
+    def test_csv(self):
+        response = self.client.get('/api/measurements/export/?min_measurement_date=2021-01-01')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="measurement.csv"')
+        rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], ['id', 'construction', 'date', 'temperature', 'humidity', 'acoustic_analysis',
+                                   'vibration'])
+        self.assertEqual([int(row[0]) for row in rows[1:]], [m.id for m in self.measurements[1:]])
+        self.assertEqual(rows[1][3:], ['20.000', '0.50', '0.00', '1.000'])
+
+    def test_ndjson(self):
+        response = self.client.get('/api/measurements/export/?output=ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [m.id for m in self.measurements])
+        self.assertEqual(rows[0]['date'], '2020-01-01')
+        # the same strings as the API and the CSV export
+        self.assertEqual(rows[1]['vibration'], '1.000')
+        detail = self.client.get('/api/measurements/%d/' % rows[1]['id']).data
+        self.assertEqual(rows[1]['humidity'], detail['humidity'])
+
+    @skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_parquet(self):
+        response = self.client.get('/api/measurements/export/?output=parquet')
+        table = pyarrow.parquet.read_table(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(table.column('id').to_pylist(), [m.id for m in self.measurements])
+        self.assertEqual(table.column('vibration').to_pylist(), [0.0, 1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(table.column('date').to_pylist()[0], date(2020, 1, 1))
+
+    def test_evaluations_and_bad_output(self):
+        response = self.client.get('/api/evaluations/export/')
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines()[0],
+                         'measurement,construction,date,foundation_mark,floor_mark,walls_mark,roof_mark,'
+                         'construction_reliability,construction_damage,final_coefficient')
+        self.assertEqual(self.client.get('/api/measurements/export/?output=xml').status_code, 400)
+
+
+class RollupTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='user12345678', phone='1')
+        self.construction = Construction.objects.create(owner=self.user, name='name', address='address', height=10,
+                                                        build_date=date(2018, 12, 8))
+        Roof.objects.create(construction=self.construction, roof_material='5')
+        Walls.objects.create(construction=self.construction, walls_material='8', thickness=1)
+        Floor.objects.create(construction=self.construction, floor_type='1')
+        Foundation.objects.create(construction=self.construction, foundation_material='2')
+        self.client.force_authenticate(self.user)
+
+    def post(self, rows):
+        response = self.client.post('/api/measurements/bulk/', [
+            dict(row, construction=self.construction.id, acoustic_analysis=0.17) for row in rows], format='json')
+        self.assertEqual(response.status_code, 201)
+        return [row['id'] for row in response.data['created']]
+
+    def assertRollupsMatch(self):
+        rollups = MeasurementRollup.objects.order_by('bucket', 'start').values_list(
+            'bucket', 'start', 'count', 'temperature_sum', 'temperature_min', 'humidity_max', 'vibration_max')
+        expected = list(rollups)
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(list(rollups), expected)
+        return expected
+
+    def test_rollups_follow_the_measurements(self):
+        ids = self.post([{'temperature': 20, 'humidity': 0.5, 'vibration': 0.25},
+                         {'temperature': 30, 'humidity': 0.7, 'vibration': 0.75}])
+        self.assertEqual(MeasurementRollup.objects.filter(bucket='week').get().count, 2)
+        self.assertRollupsMatch()
+
+        # the readings were stamped today; move one back a month and rebuild from it
+        Measurement.objects.filter(id=ids[0]).update(date=date(2021, 3, 3))
+        call_command('rebuild_rollups', stdout=StringIO())
+        ids += self.post([{'temperature': 10, 'humidity': 0.1, 'vibration': 1}])
+        self.assertEqual(MeasurementRollup.objects.filter(bucket='month').count(), 2)
+        self.assertRollupsMatch()
+
+        response = self.client.patch('/api/measurements/%d/' % ids[1], {'temperature': 40})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.assertRollupsMatch()[-1][3], Decimal(50))
+        self.client.delete('/api/measurements/%d/' % ids[2])
+        self.assertEqual(self.assertRollupsMatch()[-1][2], 1)
+
+    def test_bigint_keys(self):
+        self.assertEqual(refresh_rollups([(2 ** 40, date(2021, 3, 3))]), 0)
+
+    def test_moving_a_measurement(self):
+        other = Construction.objects.create(owner=self.user, name='other', address='address', height=10,
+                                            build_date=date(2018, 12, 8))
+        ids = self.post([{'temperature': 20, 'humidity': 0.5, 'vibration': 0.25},
+                         {'temperature': 30, 'humidity': 0.7, 'vibration': 0.75}])
+        response = self.client.patch('/api/measurements/%d/' % ids[0], {'construction': other.id})
+        self.assertEqual(response.status_code, 200)
+        rollups = MeasurementRollup.objects.filter(bucket='day')
+        self.assertEqual(sorted(rollups.values_list('construction_id', 'count', 'temperature_sum')),
+                         sorted([(self.construction.id, 1, Decimal(30)), (other.id, 1, Decimal(20))]))
+        self.assertRollupsMatch()
+
+    def test_timeseries(self):
+        ids = self.post([{'temperature': t, 'humidity': 0.5, 'vibration': 0.25} for t in (20, 21, 22, 23)])
+        for measurement_id, day in zip(ids, (date(2021, 3, 1), date(2021, 3, 7), date(2021, 3, 8), date(2021, 4, 1))):
+            Measurement.objects.filter(id=measurement_id).update(date=day)
+        call_command('rebuild_rollups', stdout=StringIO())
+        url = '/api/constructions/%d/timeseries/' % self.construction.id
+
+        response = self.client.get(url)
+        self.assertEqual([(row['start'], row['count'], row['temperature_mean']) for row in response.data],
+                         [('2021-03-01', 2, '20.500'), ('2021-03-08', 1, '22.000'), ('2021-03-29', 1, '23.000')])
+        response = self.client.get(url, {'bucket': 'month', 'min_measurement_date': '2021-03-20'})
+        self.assertEqual([(row['start'], row['count'], row['temperature_max']) for row in response.data],
+                         [('2021-03-01', 3, '22.000'), ('2021-04-01', 1, '23.000')])
+        response = self.client.get(url, {'bucket': 'day', 'max_measurement_date': '2021-03-07'})
+        self.assertEqual([row['start'] for row in response.data], ['2021-03-01', '2021-03-07'])
+        self.assertEqual(self.client.get(url, {'bucket': 'year'}).status_code, 400)
+
+
+class PartitionTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='user12345678', phone='1')
+        self.construction = Construction.objects.create(owner=self.user, name='name', address='address', height=10,
+                                                        build_date=date(1900, 12, 8))
+        Roof.objects.create(construction=self.construction, roof_material='5')
+        Walls.objects.create(construction=self.construction, walls_material='8', thickness=1)
+        Floor.objects.create(construction=self.construction, floor_type='1')
+        Foundation.objects.create(construction=self.construction, foundation_material='2')
+        self.measurements = [Measurement.objects.create(construction=self.construction, temperature=34, humidity=0.62,
+                                                        acoustic_analysis=0.17, vibration=0.86) for i in range(3)]
+        for measurement, day in zip(self.measurements, (date(1901, 5, 1), date(1902, 5, 1), date(1902, 6, 1))):
+            Measurement.objects.filter(id=measurement.id).update(date=day)
+        call_command('rebuild_rollups', stdout=StringIO())
+
+    def count(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM {}'.format(table))
+            return cursor.fetchone()[0]
+
+    def test_partitions_are_created_and_archived(self):
+        self.assertEqual(self.count(DEFAULT), 3)
+        call_command('partition_measurements', stdout=StringIO())
+        with connection.cursor() as cursor:
+            self.assertTrue({1901, 1902, date.today().year + 2} <= set(get_partitions(cursor)))
+        self.assertEqual(self.count(DEFAULT), 0)
+        self.assertEqual(self.count(partition_name(1902)), 2)
+
+        plan = Measurement.objects.filter(date__gte=date(1902, 1, 1), date__lt=date(1902, 3, 1)).explain()
+        self.assertIn(partition_name(1902), plan)
+        self.assertNotIn(partition_name(1901), plan)
+
+        update_latest_evaluations([self.construction.id])
+        self.assertEqual(Construction.objects.get().latest_evaluation_id, self.measurements[2].id)
+        call_command('partition_measurements', '--archive-before', '1903', stdout=StringIO())
+        self.assertEqual(Measurement.objects.count(), 0)
+        self.assertEqual(Evaluation.objects.count(), 0)
+        self.assertIsNone(Construction.objects.get().latest_evaluation_id)
+        self.assertEqual(self.count(archive_name(1902)), 2)
+        self.assertEqual(self.count(partition_name(1902)), 2)
+        self.assertEqual(MeasurementRollup.objects.filter(bucket='month').count(), 3)
+
+        # the archived tables no longer hold on to the construction
+        self.construction.delete()
+        self.assertEqual(self.count(partition_name(1901)), 1)
+
+
+@override_settings(EVALUATION_MODE='queue')
+class EvaluationQueueTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='user12345678', phone='1')
+        self.construction = Construction.objects.create(owner=self.user, name='name', address='address', height=10,
+                                                        build_date=date(2018, 12, 8))
+        Roof.objects.create(construction=self.construction, roof_material='5')
+        Walls.objects.create(construction=self.construction, walls_material='8', thickness=1)
+        Floor.objects.create(construction=self.construction, floor_type='1')
+        Foundation.objects.create(construction=self.construction, foundation_material='2')
+        self.client.force_authenticate(self.user)
+        self.row = {'construction': self.construction.id, 'temperature': 34, 'humidity': 0.62,
+                    'acoustic_analysis': 0.17, 'vibration': 0.86}
+
+    def status(self, measurement_id):
+        return self.client.get('/api/measurements/%d/evaluation-status/' % measurement_id).data
+
+    def test_measurements_are_evaluated_by_the_workers(self):
+        first = self.client.post('/api/measurements/', self.row).data['id']
+        second = self.client.post('/api/measurements/bulk/', [self.row], format='json').data['created'][0]['id']
+        self.assertFalse(Evaluation.objects.exists())
+        self.assertEqual(self.status(first), {'measurement': first, 'status': 'pending', 'attempts': 0, 'error': ''})
+
+        out = StringIO()
+        call_command('run_evaluation_workers', '--once', '--batch-size', '1', stdout=out)
+        self.assertIn('2 queued measurements processed', out.getvalue())
+        self.assertEqual(self.status(first)['status'], 'evaluated')
+        self.assertEqual(self.status(second)['status'], 'evaluated')
+        self.assertFalse(EvaluationTask.objects.exists())
+        self.assertEqual(Construction.objects.get().latest_evaluation_id, second)
+
+    def test_incomplete_constructions_fail(self):
+        construction = Construction.objects.create(owner=self.user, name='bare', address='address', height=1,
+                                                   build_date=date(2000, 1, 1))
+        measurement = self.client.post('/api/measurements/', dict(self.row, construction=construction.id)).data['id']
+        call_command('run_evaluation_workers', '--once', stdout=StringIO())
+        status = self.status(measurement)
+        self.assertEqual((status['status'], status['attempts']), ('failed', 1))
+        self.assertIn('roof, walls, floor and foundation', status['error'])
+
+
+    @override_settings(EVALUATION_MAX_ATTEMPTS=2)
+    def test_only_the_failing_measurement_fails(self):
+        ids = [row['id'] for row in self.client.post('/api/measurements/bulk/', [self.row] * 3,
+                                                     format='json').data['created']]
+        evaluate = tasks.evaluate_measurements
+
+        def failing(measurements, parts=None):
+            if any(measurement.id == ids[1] for measurement in measurements):
+                raise ValueError('bad reading')
+            return evaluate(measurements, parts)
+
+        with mock.patch.object(tasks, 'evaluate_measurements', failing):
+            self.assertEqual(run_evaluation_batch(), 3)
+            self.assertEqual([self.status(id)['status'] for id in ids], ['evaluated', 'pending', 'evaluated'])
+            self.assertEqual(self.status(ids[1])['attempts'], 1)
+            self.assertEqual(run_evaluation_batch(), 1)
+        status = self.status(ids[1])
+        self.assertEqual((status['status'], status['attempts']), ('failed', 2))
+        self.assertIn('bad reading', status['error'])
+        self.assertEqual(Construction.objects.get().latest_evaluation_id, ids[2])
+
+
+class AsyncViewTests(APITransactionTestCase):
+    # the views run their queries on other threads, which only see committed rows
+    def setUp(self):
+        # with connections that would outlive the test database if kept for CONN_MAX_AGE
+        patcher = mock.patch.dict(connection.settings_dict, CONN_MAX_AGE=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='user12345678', phone='1')
+        self.construction = Construction.objects.create(owner=self.user, name='name', address='address', height=10,
+                                                        build_date=date(2018, 12, 8))
+        Roof.objects.create(construction=self.construction, roof_material='5')
+        Walls.objects.create(construction=self.construction, walls_material='8', thickness=1)
+        Floor.objects.create(construction=self.construction, floor_type='1')
+        Foundation.objects.create(construction=self.construction, foundation_material='2')
+        # the async client of Django 3.2 takes headers by their own names
+        self.auth = {'authorization': 'Bearer %s' % RefreshToken.for_user(self.user).access_token}
+        self.row = {'construction': self.construction.id, 'temperature': 34, 'humidity': 0.62,
+                    'acoustic_analysis': 0.17, 'vibration': 0.86}
+
+    async def test_create_bulk_and_read(self):
+        response = await self.async_client.post('/api/async/measurements/', self.row, content_type='application/json',
+                                                **self.auth)
+        self.assertEqual(response.status_code, 201)
+        measurement = json.loads(response.content)
+        self.assertEqual(measurement['temperature'], '34.000')
+
+        rows = [self.row, dict(self.row, construction=0)]
+        response = await self.async_client.post('/api/async/measurements/bulk/',
+                                                '\n'.join(json.dumps(row) for row in rows),
+                                                content_type='application/x-ndjson', **self.auth)
+        self.assertEqual(response.status_code, 201)
+        result = json.loads(response.content)
+        self.assertEqual((len(result['created']), result['errors'][0]['index']), (1, 1))
+
+        response = await self.async_client.get('/api/async/measurements/%d/' % measurement['id'], **self.auth)
+        self.assertEqual(json.loads(response.content), measurement)
+        response = await self.async_client.get('/api/async/measurements/', **self.auth)
+        self.assertEqual(len(json.loads(response.content)['results']), 2)
+        self.assertEqual(await sync_to_async(Evaluation.objects.count)(), 2)
+
+    async def test_errors(self):
+        response = await self.async_client.post('/api/async/measurements/', self.row, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+        response = await self.async_client.post('/api/async/measurements/', dict(self.row, humidity='wet'),
+                                                content_type='application/json', **self.auth)
+        self.assertEqual((response.status_code, list(json.loads(response.content))), (400, ['humidity']))
+        response = await self.async_client.post('/api/async/measurements/', b'{', content_type='application/json',
+                                                **self.auth)
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.delete('/api/async/measurements/1/', **self.auth)
+        self.assertEqual(response.status_code, 405)
+
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class StatelessAuthenticationTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='user12345678', phone='1')
+        other = CustomUser.objects.create_user(email='other@example.com', password='user12345678', phone='2')
+        for owner in (self.user, other):
+            Construction.objects.create(owner=owner, name='name', address='address', height=10,
+                                        build_date=date(2000, 1, 1))
+        self.authenticate(self.user.token.access_token)
+
+    def authenticate(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer %s' % token)
+
+    def get(self, url='/api/constructions/'):
+        # the response and the user queries it took
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [query['sql'] for query in queries if 'FROM "building_customuser"' in query['sql']]
+
+    def test_reads_without_user_queries(self):
+        self.get()
+        response, queries = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(queries, [])
+
+    def test_claims(self):
+        admin = CustomUser.objects.create_superuser(email='admin@example.com', password='user12345678')
+        self.authenticate(admin.token.access_token)
+        self.assertEqual(len(self.get()[0].data['results']), 2)
+        self.assertEqual(self.get('/api/users/me/')[0].data['email'], 'admin@example.com')
+
+    def test_revoked(self):
+        self.assertEqual(self.get()[0].status_code, 200)
+        self.user.set_password('changed12345678')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.get()[0].status_code, 401)
+        self.authenticate(CustomUser.objects.get(id=self.user.id).token.access_token)
+        self.assertEqual(self.get()[0].status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.filter(id=self.user.id).update(is_active=False)
+            CustomUser.objects.get(id=self.user.id).save()
+        self.assertEqual(self.get()[0].status_code, 401)
+
+    def test_token_without_claims(self):
+        self.authenticate(RefreshToken.for_user(self.user).access_token)
+        response, queries = self.get()
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(len(queries), 1)
+
+
+class TokenBlacklistTests(APITestCase):
+    def setUp(self):
+        blacklist_filter.clear()
+        self.addCleanup(blacklist_filter.clear)
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='user12345678', phone='1')
+
+    def refresh(self, token):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/token/refresh/', {'refresh': str(token)}, format='json')
+        return response, [query['sql'] for query in queries if 'token_blacklist' in query['sql']]
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add('jti %d' % i)
+        self.assertTrue(all('jti %d' % i in bloom for i in range(1000)))
+        self.assertLess(sum('other %d' % i in bloom for i in range(10000)), 300)
+
+    def test_logout(self):
+        token = self.user.token
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer %s' % token.access_token)
+        response = self.client.post('/api/users/logout/', {'refresh': str(token)}, format='json')
+        self.assertEqual(response.status_code, 204)
+        response, queries = self.refresh(token)
+        self.assertEqual(response.status_code, 401)
+        self.assertTrue(queries)
+
+        # a token that is not blacklisted is refreshed without looking at the tables
+        response, queries = self.refresh(self.user.token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    @override_settings(TOKEN_BLACKLIST_SYNC_INTERVAL=0)
+    def test_blacklisted_elsewhere(self):
+        token = self.user.token
+        self.assertEqual(self.refresh(token)[0].status_code, 200)
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+        self.assertEqual(self.refresh(token)[0].status_code, 401)
+
+    def test_prune(self):
+        now = datetime.now(timezone.utc)
+        tokens = OutstandingToken.objects.bulk_create([
+            OutstandingToken(jti='jti %d' % i, token='token', expires_at=now + timedelta(days=1 if i % 2 else -1))
+            for i in range(10)])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in tokens[:6]])
+        call_command('prune_tokens', chunk_size=2, stdout=StringIO())
+        self.assertEqual(sorted(OutstandingToken.objects.values_list('jti', flat=True)),
+                         ['jti %d' % i for i in (1, 3, 5, 7, 9)])
+        self.assertEqual(BlacklistedToken.objects.count(), 3)
+
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class UserProvisioningTests(APITestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(email='admin@example.com', password='user12345678', phone='0')
+        self.client.force_authenticate(self.admin)
+
+    def row(self, i, **values):
+        return dict({'email': 'user%d@example.com' % i, 'password': 'password%d' % i, 'phone': str(i),
+                     'first_name': 'first', 'last_name': 'last'}, **values)
+
+    @override_settings(PASSWORD_HASH_WORKERS=4)
+    def test_bulk(self):
+        rows = [self.row(1), self.row(2, email='admin@example.com'), self.row(3), self.row(4, phone='3'),
+                self.row(5, password='short')]
+        # the server process is never forked
+        with mock.patch('building.users.ProcessPoolExecutor') as executor:
+            response = self.client.post('/api/users/bulk/', rows, format='json')
+        executor.assert_not_called()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([user['email'] for user in response.data['created']],
+                         ['user1@example.com', 'user3@example.com'])
+        self.assertEqual([(error['index'], list(error['errors'])) for error in response.data['errors']],
+                         [(1, ['email']), (3, ['phone']), (4, ['password'])])
+        self.assertTrue(CustomUser.objects.get(email='user3@example.com').check_password('password3'))
+
+        response = self.client.post('/api/users/bulk/', [self.row(1)], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(CustomUser.objects.get(email='user1@example.com'))
+        self.assertEqual(self.client.post('/api/users/bulk/', [self.row(6)], format='json').status_code, 403)
+
+    def test_hash_passwords(self):
+        passwords = ['password%d' % i for i in range(5)]
+        encoded = hash_passwords(passwords, workers=2)
+        self.assertTrue(all(check_password(password, hashed) for password, hashed in zip(passwords, encoded)))
+        self.assertTrue(encoded[0].startswith('md5$'))
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as stream:
+            writer = csv.DictWriter(stream, ['email', 'password', 'phone', 'first_name', 'last_name'])
+            writer.writeheader()
+            writer.writerows([self.row(1), self.row(2), self.row(3, email='user1@example.com')])
+            stream.flush()
+            stderr = StringIO()
+            call_command('provision_users', stream.name, workers=1, chunk_size=2, stdout=StringIO(), stderr=stderr)
+        self.assertIn('Skipped row 3', stderr.getvalue())
+        call_command('provision_users', fake=5, workers=1, stdout=StringIO())
+        self.assertEqual(CustomUser.objects.count(), 8)
+
+
+
+class RiskSummaryTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='user12345678', phone='1')
+        other = CustomUser.objects.create_user(email='other@example.com', password='user12345678', phone='2')
+        self.damages = [Decimal('0.1'), Decimal('0.4'), Decimal('0.2'), Decimal('1.5'), Decimal('0.9'), None]
+        constructions = Construction.objects.bulk_create([
+            Construction(owner=owner, name='name', address='address', height=10, build_date=date(2000, 1, 1),
+                         construction_type=construction_type, construction_damage=damage,
+                         construction_reliability=None if damage is None else 1 - damage,
+                         final_coefficient=None if damage is None else damage / 2)
+            for owner, construction_type, damage in zip([self.user] * 6 + [other], '112223' + '1',
+                                                        self.damages + [Decimal('9')])])
+        Roof.objects.bulk_create([Roof(construction=construction, roof_material='5' if i % 2 else '2')
+                                  for i, construction in enumerate(constructions[:4])])
+        self.client.force_authenticate(self.user)
+
+    def test_summary(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/constructions/risk-summary/')
+        self.assertEqual(response.status_code, 200)
+        total = response.data['total']
+        self.assertEqual((total['count'], total['evaluated']), (6, 5))
+        damages = [float(damage) for damage in self.damages if damage is not None]
+        self.assertEqual(total['construction_damage']['max'], 1.5)
+        self.assertAlmostEqual(total['construction_damage']['mean'], sum(damages) / 5, places=3)
+        for percentile in (10, 25, 50, 75, 90):
+            self.assertAlmostEqual(total['construction_damage']['p%d' % percentile],
+                                   np.percentile(damages, percentile), places=3)
+
+        types = response.data['construction_type']
+        self.assertEqual([(group['value'], group['label'], group['count']) for group in types],
+                         [('1', 'Residential', 2), ('2', 'Historical', 3), ('3', 'Another', 1)])
+        self.assertEqual(types[2]['construction_damage']['p50'], None)
+        self.assertEqual([(group['value'], group['count'], group['construction_damage']['max'])
+                          for group in response.data['roof_material']], [('2', 2, 0.2), ('5', 2, 1.5), (None, 2, 0.9)])
+
+    def test_filters(self):
+        response = self.client.get('/api/constructions/risk-summary/', {'construction_type': ['2', '3']})
+        self.assertEqual(response.data['total']['count'], 4)
+        self.assertEqual([group['value'] for group in response.data['construction_type']], ['2', '3'])
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class AtRiskTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='user12345678', phone='1')
+        other = CustomUser.objects.create_user(email='other@example.com', password='user12345678', phone='2')
+        self.constructions = Construction.objects.bulk_create([
+            Construction(owner=owner, name='name', address='address', height=10, build_date=date(2000, 1, 1),
+                         construction_damage=damage)
+            for owner, damage in zip([self.user] * 5 + [other], [Decimal('0.4'), None, Decimal('0.9'), Decimal('0.4'),
+                                                                  Decimal('0.1'), Decimal('9')])])
+        self.client.force_authenticate(self.user)
+
+    def ranking(self, **params):
+        response = self.client.get('/api/constructions/at-risk/', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data]
+
+    def predict(self, construction, warning):
+        prediction = Prediction.objects.create(construction=construction, years_until_full_fix=warning + 5,
+                                               years_until_full_warning=warning, construction_damage_predicted=[1])
+        update_latest_predictions([construction.id])
+        return prediction
+
+    def test_by_damage(self):
+        ids = [construction.id for construction in self.constructions]
+        self.assertEqual(self.ranking(), [ids[2], ids[0], ids[3], ids[4]])
+        self.assertEqual(self.ranking(k=2), [ids[2], ids[0]])
+        self.user.is_superuser = True
+        self.user.save()
+        self.assertEqual(self.ranking(k=2), [ids[5], ids[2]])
+
+    def test_by_warning(self):
+        first, second, third = self.constructions[:3]
+        self.predict(first, Decimal('3'))
+        self.predict(first, Decimal('20'))
+        latest = self.predict(second, Decimal('10'))
+        self.predict(self.constructions[5], Decimal('1'))
+        predict_constructions([(third.id, Decimal('0.9'), third.build_date)])
+        third.refresh_from_db()
+        self.assertIsNotNone(third.years_until_full_warning)
+        self.assertEqual(self.ranking(by='warning'), sorted(
+            [first.id, second.id, third.id], key=lambda id: Construction.objects.get(id=id).years_until_full_warning))
+
+        self.assertEqual(self.client.delete('/api/predictions/%d/' % latest.id).status_code, 204)
+        self.assertNotIn(second.id, self.ranking(by='warning'))
+        self.assertEqual(Construction.objects.get(id=first.id).years_until_full_warning, 20)
+
+    def test_invalid(self):
+        for params in ({'k': 0}, {'k': 1001}, {'by': 'height'}):
+            self.assertEqual(self.client.get('/api/constructions/at-risk/', params).status_code, 400)
+
+
+class ConnectionPoolTests(APITestCase):
+    def setUp(self):
+        self.pool = ConnectionPool(lambda: connect(connection.get_connection_params()), max_size=1, timeout=0.05)
+        self.addCleanup(self.pool.close)
+
+    def getconn(self, **kwargs):
+        raw = self.pool.getconn(**kwargs)
+        self.addCleanup(self.pool.discard, raw)
+        return raw
+
+    def terminate(self, raw):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [raw.get_backend_pid()])
+        time.sleep(0.05)
+
+    def test_reuse_and_timeout(self):
+        raw = self.getconn()
+        with self.assertRaises(PoolTimeout):
+            self.getconn()
+        self.pool.putconn(raw)
+        self.assertIs(self.getconn(), raw)
+
+    def test_returned_connection_rolled_back(self):
+        raw = self.getconn()
+        raw.cursor().execute('SELECT 1')
+        self.pool.putconn(raw)
+        self.assertIs(self.getconn(), raw)
+        self.assertEqual(raw.info.transaction_status, 0)
+
+    def test_recycle_and_closed(self):
+        self.pool.recycle = 0
+        raw = self.getconn()
+        self.pool.putconn(raw)
+        self.assertTrue(raw.closed)
+        self.pool.recycle = None
+        raw = self.getconn()
+        raw.close()
+        self.pool.putconn(raw)
+        self.assertIsNot(self.getconn(), raw)
+        self.assertEqual(self.pool.opened, 1)
+
+    def test_health_check(self):
+        raw = self.getconn()
+        self.pool.putconn(raw)
+        self.terminate(raw)
+        fresh = self.getconn(check=True)
+        self.assertIsNot(fresh, raw)
+        fresh.cursor().execute('SELECT 1')
+
+    def test_database_wrapper(self):
+        settings_dict = dict(connection.settings_dict, CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=True, POOL={'MAX_SIZE': 1})
+        wrapper = DatabaseWrapper(settings_dict, alias='pool_test')
+        wrapper.ensure_connection()
+        raw = wrapper.connection
+        self.addCleanup(wrapper.get_pool(wrapper.get_connection_params()).close)
+        self.addCleanup(wrapper.close)
+        wrapper.close()
+        self.assertFalse(raw.closed)
+        wrapper.ensure_connection()
+        self.assertIs(wrapper.connection, raw)
+
+        # a persistent connection lost between requests is replaced before the next query
+        wrapper.settings_dict['CONN_MAX_AGE'] = 60
+        wrapper.close_if_unusable_or_obsolete()
+        self.terminate(raw)
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.assertIsNot(wrapper.connection, raw)
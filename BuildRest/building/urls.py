@@ -1,6 +1,6 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenRefreshView
+from . import async_views
 from .views import *
 
 
@@ -9,6 +9,9 @@ urlpatterns = [
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('users/logout/', LogoutAPIView.as_view(), name='logout'),
     path('users/me/', ProfileAPIView.as_view(), name='profile'),
+    path('async/measurements/', async_views.measurements, name='async-measurement-list'),
+    path('async/measurements/bulk/', async_views.bulk_measurements, name='async-measurement-bulk'),
+    path('async/measurements/<int:pk>/', async_views.measurement, name='async-measurement-detail'),
 ]
 router = DefaultRouter()
 router.register('users', CustomUserViewSet, basename='user')
@@ -0,0 +1,78 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.db import transaction
+from django.db.models import Q
+from .models import CustomUser
+from .serializers import BulkUserSerializer
+
+# Hashing a password is slow on purpose, and it is what limits how fast users can be created.
+# The provision_users command hashes the passwords of many users at once in PASSWORD_HASH_WORKERS
+# processes, kept between calls, and inserts the users with one bulk_create. Web requests hash in
+# their own process: forking a server process, which may be running other threads, can deadlock.
+
+executors = {}
+
+
+def hash_chunk(passwords, hasher):
+    return [make_password(password, hasher=hasher) for password in passwords]
+
+
+def hash_passwords(passwords, workers=None, hasher='default'):
+    # resolved here, the workers only know the settings of when they were forked
+    hasher = get_hasher(hasher)
+    passwords = list(passwords)
+    workers = settings.PASSWORD_HASH_WORKERS if workers is None else workers
+    if workers <= 1 or len(passwords) < 2:
+        return hash_chunk(passwords, hasher)
+    if workers not in executors:
+        executors[workers] = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+    size = -(-len(passwords) // workers)
+    chunks = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+    try:
+        results = list(executors[workers].map(hash_chunk, chunks, [hasher] * len(chunks)))
+    except BrokenProcessPool:
+        executors.pop(workers)
+        raise
+    return [encoded for chunk in results for encoded in chunk]
+
+
+def provision_users(rows, workers=None, hasher='default'):
+    errors = []
+    valid = []
+    for index, row in enumerate(rows):
+        serializer = BulkUserSerializer(data=row)
+        if serializer.is_valid():
+            data = serializer.validated_data
+            data['email'] = CustomUser.objects.normalize_email(data['email'])
+            valid.append((index, data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+
+    # unique among the rows and against the table
+    taken = CustomUser.objects.filter(Q(email__in=[data['email'] for index, data in valid]) |
+                                      Q(phone__in=[data.get('phone', '') for index, data in valid]))
+    emails, phones = set(), set()
+    for email, phone in taken.values_list('email', 'phone'):
+        emails.add(email)
+        phones.add(phone)
+    users = []
+    for index, data in valid:
+        phone = data.get('phone', '')
+        if data['email'] in emails:
+            errors.append({'index': index, 'errors': {'email': ['custom user with this email already exists.']}})
+        elif phone in phones:
+            errors.append({'index': index, 'errors': {'phone': ['custom user with this phone already exists.']}})
+        else:
+            emails.add(data['email'])
+            phones.add(phone)
+            users.append(CustomUser(**data))
+
+    for user, encoded in zip(users, hash_passwords([user.password for user in users], workers, hasher)):
+        user.password = encoded
+    with transaction.atomic():
+        users = CustomUser.objects.bulk_create(users)
+    errors.sort(key=lambda error: error['index'])
+    return users, errors
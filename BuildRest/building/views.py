@@ -1,13 +1,26 @@
+from django.db.models import DecimalField, ExpressionWrapper, F
+from django.db.models.functions import Now
 from django_filters import rest_framework as filters
 from rest_framework import status, mixins
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
+from rest_framework_simplejwt import views as jwt_views
+from .cache import invalidate_constructions
 from .evaluate import evaluate
+from .ingest import ingest_measurements, predict_constructions, update_latest_evaluations, update_latest_predictions
+from .mixins import CachedResponseMixin, ConditionalGetMixin, ExportMixin, FastListMixin
+from .pagination import KeysetPagination
+from .parsers import FastJSONParser, NDJSONParser
 from .serializers import *
 from .predict import *
+from .risk import risk_summary
+from .rollups import METRICS, bucket_start, refresh_rollups
+from .tasks import evaluation_status
+from .users import provision_users
 
 
 class RegisterAPIView(APIView):
@@ -33,7 +46,21 @@ class CustomUserViewSet(mixins.RetrieveModelMixin,
     def get_queryset(self):
         if self.request.user.is_superuser:
             return CustomUser.objects.all()
-        return CustomUser.objects.filter(email=self.request.user)
+        return CustomUser.objects.filter(id=self.request.user.id)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser],
+            parser_classes=[FastJSONParser, NDJSONParser])
+    def bulk(self, request):
+        if not isinstance(request.data, list):
+            raise ValidationError('Expected a list of users.')
+        users, errors = provision_users(request.data, workers=1)
+        result = {
+            'created': CustomUserSerializer(users, many=True).data,
+            'errors': errors,
+        }
+        if errors and not users:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_201_CREATED)
 
 
 class LoginAPIView(APIView):
@@ -59,12 +86,19 @@ class LogoutAPIView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class TokenRefreshView(jwt_views.TokenRefreshView):
+    serializer_class = TokenRefreshSerializer
+
+
 class ProfileAPIView(APIView):
     permission_classes = (IsAuthenticated,)
     serializer_class = CustomUserSerializer
 
     def get(self, request):
-        user = CustomUser.objects.get(email=self.request.user)
+        user = request.user
+        if not isinstance(user, CustomUser):
+            # a TokenUser only has the claims of the token
+            user = CustomUser.objects.get(id=user.id)
         serializer = self.serializer_class(user)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -177,8 +211,9 @@ class ConstructionFilter(filters.FilterSet):
                   ]
 
 
-class ConstructionViewSet(ModelViewSet):
+class ConstructionViewSet(CachedResponseMixin, ConditionalGetMixin, FastListMixin, ModelViewSet):
     serializer_class = CreateConstructionSerializer
+    fast_serializer_class = ConstructionSerializer
     filter_class = ConstructionFilter
 
     def get_serializer_class(self):
@@ -196,14 +231,52 @@ class ConstructionViewSet(ModelViewSet):
         return [permission() for permission in permission_classes]
 
     def get_queryset(self):
-        user = CustomUser.objects.get(email=self.request.user)
+        user = self.request.user
         result_set = Construction.objects.all()
         if not user.is_superuser:
             result_set = Construction.objects.filter(owner_id=user.id)
-        if not(self.action == 'update' or self.action == 'partial_update'):
-            result_set = result_set.select_related('roof', 'walls', 'floor', 'foundation')
+        if not(self.action == 'update' or self.action == 'partial_update' or self.action == 'timeseries'):
+            result_set = result_set.select_related('owner', 'roof', 'walls', 'floor', 'foundation')
         return result_set
 
+    @action(detail=True, methods=['get'])
+    def timeseries(self, request, pk=None):
+        query = TimeseriesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        construction = self.get_object()
+        rollups = MeasurementRollup.objects.filter(construction_id=construction.id,
+                                                   bucket=query.validated_data['bucket'])
+        if 'min_measurement_date' in query.validated_data:
+            rollups = rollups.filter(start__gte=bucket_start(query.validated_data['bucket'],
+                                                             query.validated_data['min_measurement_date']))
+        if 'max_measurement_date' in query.validated_data:
+            rollups = rollups.filter(start__lte=query.validated_data['max_measurement_date'])
+        rollups = rollups.order_by('start').annotate(**{
+            metric + '_mean': ExpressionWrapper(F(metric + '_sum') / F('count'), output_field=DecimalField())
+            for metric in METRICS})
+        return Response(MeasurementRollupSerializer(rollups, many=True).data)
+
+    @action(detail=False, methods=['get'], url_path='risk-summary')
+    def risk_summary(self, request):
+        return Response(risk_summary(self.filter_queryset(self.get_queryset())))
+
+    @action(detail=False, methods=['get'], url_path='at-risk')
+    def at_risk(self, request):
+        # the k most damaged, or soonest to need repair, read in order off the partial indexes on
+        # the latest evaluation and prediction columns, whatever the number of constructions
+        return self.get_cached_response(self.get_at_risk, request)
+
+    def get_at_risk(self, request):
+        query = AtRiskQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        if query.validated_data['by'] == 'damage':
+            constructions = self.get_queryset().filter(construction_damage__isnull=False).order_by(
+                '-construction_damage', 'id')
+        else:
+            constructions = self.get_queryset().filter(years_until_full_warning__isnull=False).order_by(
+                'years_until_full_warning', 'id')
+        return Response(ConstructionSerializer(constructions[:query.validated_data['k']], many=True).data)
+
 
 class FoundationViewSet(ModelViewSet):
     serializer_class = CreateFoundationSerializer
@@ -217,7 +290,7 @@ class FoundationViewSet(ModelViewSet):
     def get_queryset(self):
         if self.request.user.is_superuser:
             return Foundation.objects.all()
-        return Foundation.objects.filter(construction__owner=self.request.user)
+        return Foundation.objects.filter(construction__owner_id=self.request.user.id)
 
 
 class RoofViewSet(ModelViewSet):
@@ -232,7 +305,7 @@ class RoofViewSet(ModelViewSet):
     def get_queryset(self):
         if self.request.user.is_superuser:
             return Roof.objects.all()
-        return Roof.objects.filter(construction__owner=self.request.user)
+        return Roof.objects.filter(construction__owner_id=self.request.user.id)
 
 
 class WallsViewSet(ModelViewSet):
@@ -247,7 +320,7 @@ class WallsViewSet(ModelViewSet):
     def get_queryset(self):
         if self.request.user.is_superuser:
             return Walls.objects.all()
-        return Walls.objects.filter(construction__owner=self.request.user)
+        return Walls.objects.filter(construction__owner_id=self.request.user.id)
 
 
 class FloorViewSet(ModelViewSet):
@@ -262,7 +335,7 @@ class FloorViewSet(ModelViewSet):
     def get_queryset(self):
         if self.request.user.is_superuser:
             return Floor.objects.all()
-        return Floor.objects.filter(construction__owner=self.request.user)
+        return Floor.objects.filter(construction__owner_id=self.request.user.id)
 
 
 class MeasurementFilter(filters.FilterSet):
@@ -276,10 +349,15 @@ class MeasurementFilter(filters.FilterSet):
         fields = ['min_measurement_date', 'max_measurement_date', 'construction', ]
 
 
-class MeasurementViewSet(ModelViewSet):
+class MeasurementViewSet(ConditionalGetMixin, ExportMixin, FastListMixin, ModelViewSet):
     serializer_class = CreateMeasurementSerializer
+    fast_serializer_class = MeasurementSerializer
+    export_fields = [('id', 'id'), ('construction', 'construction_id'), ('date', 'date'),
+                     ('temperature', 'temperature'), ('humidity', 'humidity'),
+                     ('acoustic_analysis', 'acoustic_analysis'), ('vibration', 'vibration')]
     permission_classes = [IsAdminUser | IsAuthenticated, ]
     filter_class = MeasurementFilter
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         if self.action == 'list' or self.action == 'retrieve':
@@ -287,10 +365,39 @@ class MeasurementViewSet(ModelViewSet):
         return self.serializer_class
 
     def get_queryset(self):
-        user = CustomUser.objects.get(email=self.request.user)
+        user = self.request.user
         if user.is_superuser:
             return Measurement.objects.all()
-        return Measurement.objects.filter(construction__owner=self.request.user)
+        return Measurement.objects.filter(construction__owner_id=self.request.user.id)
+
+    def perform_update(self, serializer):
+        previous = (serializer.instance.construction_id, serializer.instance.date)
+        measurement = serializer.save()
+        update_latest_evaluations([previous[0], measurement.construction_id])
+        refresh_rollups([previous, (measurement.construction_id, measurement.date)])
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        update_latest_evaluations([instance.construction_id])
+        refresh_rollups([(instance.construction_id, instance.date)])
+
+    @action(detail=False, methods=['post'], parser_classes=[FastJSONParser, NDJSONParser])
+    def bulk(self, request):
+        if not isinstance(request.data, list):
+            raise ValidationError('Expected a list of measurements.')
+        measurements, errors = ingest_measurements(request.data, request.user)
+        result = {
+            'created': MeasurementSerializer(measurements, many=True).data,
+            'errors': errors,
+        }
+        if errors and not measurements:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'], url_path='evaluation-status')
+    def evaluation_status(self, request, pk=None):
+        measurement = self.get_object()
+        return Response(dict(evaluation_status(measurement.id), measurement=measurement.id))
 
 
 class EvaluationFilter(filters.FilterSet):
@@ -304,14 +411,22 @@ class EvaluationFilter(filters.FilterSet):
         fields = ['min_evaluation_date', 'max_evaluation_date', 'construction', ]
 
 
-class EvaluationViewSet(ModelViewSet):
+class EvaluationViewSet(ExportMixin, FastListMixin, ModelViewSet):
     permission_classes = [IsAdminUser | IsAuthenticated, ]
     serializer_class = EvaluationSerializer
+    fast_serializer_class = EvaluationSerializer
+    export_fields = [('measurement', 'measurement_id'), ('construction', 'measurement__construction_id'),
+                     ('date', 'measurement__date'), ('foundation_mark', 'foundation_mark'),
+                     ('floor_mark', 'floor_mark'), ('walls_mark', 'walls_mark'), ('roof_mark', 'roof_mark'),
+                     ('construction_reliability', 'construction_reliability'),
+                     ('construction_damage', 'construction_damage'), ('final_coefficient', 'final_coefficient')]
     filter_class = EvaluationFilter
+    pagination_class = KeysetPagination
+    keyset_ordering = ('measurement__date', 'measurement_id')
 
     def create(self, request, *args, **kwargs):
         measurement_id = request.data.get('measurement')
-        user = CustomUser.objects.get(email=self.request.user)
+        user = self.request.user
         queryset = Construction.objects.filter(owner_id=user.id).values_list('id', flat=True)
         measurement = Measurement.objects.get(id=measurement_id)
         if measurement.construction_id in queryset or user.is_superuser:
@@ -327,15 +442,26 @@ class EvaluationViewSet(ModelViewSet):
             serializer = CreateEvaluationSerializer(data=result)
             if serializer.is_valid(raise_exception=True):
                 serializer.save()
+                update_latest_evaluations([measurement.construction_id])
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         raise PermissionDenied
 
+    def perform_update(self, serializer):
+        previous = serializer.instance.measurement.construction_id
+        evaluation = serializer.save()
+        update_latest_evaluations([previous, evaluation.measurement.construction_id])
+
+    def perform_destroy(self, instance):
+        construction_id = instance.measurement.construction_id
+        instance.delete()
+        update_latest_evaluations([construction_id])
+
     def get_queryset(self):
-        user = CustomUser.objects.get(email=self.request.user)
+        user = self.request.user
         if user.is_superuser:
             return Evaluation.objects.all()
         else:
-            return Evaluation.objects.filter(measurement__construction__owner=self.request.user)
+            return Evaluation.objects.filter(measurement__construction__owner_id=self.request.user.id)
 
 
 class PredictionFilter(filters.FilterSet):
@@ -349,33 +475,83 @@ class PredictionFilter(filters.FilterSet):
         fields = ['min_prediction_date', 'max_prediction_date', 'construction', ]
 
 
-class PredictionViewSet(ModelViewSet):
+class PredictionViewSet(ConditionalGetMixin, ModelViewSet):
     serializer_class = PredictionSerializer
     queryset = Prediction.objects.all()
     permission_classes = [IsAdminUser | IsAuthenticated, ]
     filter_class = PredictionFilter
+    pagination_class = KeysetPagination
 
     def create(self, request, *args, **kwargs):
-        construction_id = request.data.get('construction')
-        user = CustomUser.objects.get(email=self.request.user)
-        if user.is_superuser:
-            queryset = Construction.objects.all()
-        else:
-            queryset = Construction.objects.filter(owner_id=user.id).values_list('id', flat=True)
-        if construction_id in queryset or user.is_superuser:
-            evaluation_id = Measurement.objects.filter(construction_id=construction_id).order_by('id').last()
-            evaluation_data = Evaluation.objects.get(measurement_id=evaluation_id)
-            build_date = Construction.objects.get(id=construction_id)
-            result = prediction(construction_id, evaluation_data.final_coefficient, build_date.build_date)
+        query = PredictionRequestSerializer(data=request.data)
+        query.is_valid(raise_exception=True)
+        user = self.request.user
+        construction = Construction.objects.filter(id=query.validated_data['construction']).first()
+        if construction is not None and (construction.owner_id == user.id or user.is_superuser):
+            if construction.latest_evaluation_id is None:
+                raise ValidationError({'construction': ['This construction has not been evaluated yet.']})
+            result = prediction(construction.id, construction.final_coefficient, construction.build_date)
             serializer = CreatePredictionSerializer(data=result)
             if serializer.is_valid(raise_exception=True):
-                serializer.save()
+                created = serializer.save()
+                # a new prediction is the latest one of its construction
+                Construction.objects.filter(id=construction.id).update(
+                    years_until_full_warning=created.years_until_full_warning, updated_at=Now())
+                invalidate_constructions([(construction.id, construction.owner_id)])
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         raise PermissionDenied
 
     def get_queryset(self):
-        user = CustomUser.objects.get(email=self.request.user)
+        user = self.request.user
         if user.is_superuser:
             return Prediction.objects.all()
         else:
-            return Prediction.objects.filter(construction__owner=self.request.user)
+            return Prediction.objects.filter(construction__owner_id=self.request.user.id)
+
+    def perform_update(self, serializer):
+        previous = serializer.instance.construction_id
+        prediction = serializer.save()
+        update_latest_predictions([previous, prediction.construction_id])
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        update_latest_predictions([instance.construction_id])
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        serializer = BatchPredictionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = self.request.user
+        if user.is_superuser:
+            constructions = Construction.objects.all()
+        else:
+            constructions = Construction.objects.filter(owner_id=user.id)
+        requested = serializer.validated_data.get('constructions')
+        if requested is None:
+            filterset = ConstructionFilter(request.query_params, queryset=constructions, request=request)
+            if not filterset.is_valid():
+                raise ValidationError(filterset.errors)
+            constructions = filterset.qs
+        else:
+            constructions = constructions.filter(id__in=requested)
+        rows = list(constructions.order_by('id').values_list('id', 'final_coefficient', 'build_date'))
+        predictions = predict_constructions([row for row in rows if row[1] is not None],
+                                            serializer.validated_data['horizons'], serializer.validated_data['step'])
+
+        created = {prediction.construction_id for prediction in predictions}
+        found = {row[0] for row in rows}
+        unevaluated = {row[0] for row in rows if row[1] is None}
+        errors = [{'construction': id, 'errors': ['This construction has not been evaluated yet.'
+                                                  if id in unevaluated else
+                                                  'This construction could not be predicted from its latest '
+                                                  'evaluation.']} for id in sorted(found - created)]
+        if requested is not None:
+            errors += [{'construction': id, 'errors': ['Not found.']}
+                       for id in dict.fromkeys(requested) if id not in found]
+        result = {
+            'created': PredictionSerializer(predictions, many=True).data,
+            'errors': errors,
+        }
+        if errors and not predictions:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_201_CREATED)